@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import file_ops
+from data_profiler import ColumnProfiles
+from config import ARTIFACT_DIR, ARTIFACT_INLINE_CHARS, ARTIFACT_SUMMARY_CHARS, ARTIFACT_FETCH_MAX_CHARS
+
+# Step outputs are saved once under their content hash. The context passed to later
+# steps carries a short handle and summary instead, and agents fetch the full content
+# on demand with the fetch_artifact tool.
+
+# Tool schema shared by every agent that reads earlier step outputs
+FETCH_ARTIFACT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "fetch_artifact",
+        "description": "Fetch the full content of an earlier step's output from its artifact handle",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "artifact": {
+                    "type": "string",
+                    "description": "The artifact handle from the context"
+                },
+                "start": {
+                    "type": "integer",
+                    "description": "Character offset to start reading from"
+                }
+            },
+            "required": ["artifact"]
+        }
+    }
+}
+
+def artifact_path(handle):
+    return os.path.join(ARTIFACT_DIR, f"{handle}.txt")
+
+def keep_inline(value):
+    # DataFrames stay in the context; queries run against them and the serializer already bounds them.
+    # Column profiles stay too, since later agents need them in their prompts rather than behind a handle.
+    if isinstance(value, (pd.DataFrame, pd.Series, ColumnProfiles)):
+        return True
+    if isinstance(value, dict):
+        return any(keep_inline(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(keep_inline(item) for item in value)
+    return False
+
+def summarize(text):
+    preview = " ".join(text[:ARTIFACT_SUMMARY_CHARS * 2].split())
+    if len(preview) > ARTIFACT_SUMMARY_CHARS or len(text) > ARTIFACT_SUMMARY_CHARS:
+        preview = preview[:ARTIFACT_SUMMARY_CHARS] + "..."
+    return preview
+
+def put(text):
+    # Identical content maps to the same handle and is only written once
+    handle = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    path = artifact_path(handle)
+    if not os.path.exists(path):
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        file_ops.atomic_write(path, text)
+    return handle
+
+def get(handle):
+    with open(artifact_path(handle), 'r') as file:
+        return file.read()
+
+def store_value(value):
+    # Returns the value unchanged when it is small enough to inline, otherwise a handle and summary
+    if keep_inline(value):
+        return value
+    if isinstance(value, str):
+        text, kind = value, "text"
+    else:
+        from context_serializer import to_jsonable
+        text, kind = json.dumps(to_jsonable(value), indent=2), "json"
+    if len(text) <= ARTIFACT_INLINE_CHARS:
+        return value
+    return {"artifact": put(text), "kind": kind, "chars": len(text), "summary": summarize(text)}
+
+def store_updates(updates):
+    return {key: store_value(value) for key, value in (updates or {}).items()}
+
+def fetch_artifact(handle, start=0, max_chars=ARTIFACT_FETCH_MAX_CHARS):
+    try:
+        text = get(handle)
+    except FileNotFoundError:
+        return f"Error fetching artifact: no artifact {handle}"
+    except Exception as e:
+        return f"Error fetching artifact: {str(e)}"
+    start = max(0, start or 0)
+    chunk = text[start:start + max_chars]
+    if start + max_chars < len(text):
+        chunk += f"\n... [{len(text) - start - max_chars} more characters; fetch again with start={start + max_chars}]"
+    return chunk
+
+def fetch_handler(arguments):
+    return fetch_artifact(arguments["artifact"], arguments.get("start", 0))
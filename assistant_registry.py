@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from config import ASSISTANT_REGISTRY_PATH, ASSISTANT_REGISTRY_TTL_DAYS
+from tracing import span
+
+# Assistants are keyed by a hash of everything that defines their behaviour, created
+# once and reused across steps and processes via a small JSON store on disk.
+_lock = threading.Lock()
+# Definitions of the assistants handed out by this process, so a deleted one can be recreated
+_definitions = {}
+
+def assistant_key(model, instructions, tools, **kwargs):
+    definition = {
+        "model": model,
+        "instructions": instructions,
+        "tools": tools,
+        **kwargs
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+def load_registry(path=ASSISTANT_REGISTRY_PATH):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_registry(registry, path=ASSISTANT_REGISTRY_PATH):
+    # Write to a temp file and rename so concurrent processes never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".assistant_registry.")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(registry, file, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def get_assistant_id(client, model, instructions, tools, path=ASSISTANT_REGISTRY_PATH, **kwargs):
+    key = assistant_key(model, instructions, tools, **kwargs)
+    with span("assistant.get", model=model) as assistant_span, _lock:
+        # Re-read the store so assistants created by other processes are picked up
+        registry = load_registry(path)
+        entry = registry.get(key)
+        assistant_span.set(created=entry is None)
+        if entry is None:
+            assistant = client.beta.assistants.create(
+                model=model,
+                instructions=instructions,
+                tools=tools,
+                metadata={"registry_key": key},
+                **kwargs
+            )
+            entry = {"assistant_id": assistant.id, "model": model, "created_at": time.time()}
+            registry[key] = entry
+        entry["last_used"] = time.time()
+        save_registry(registry, path)
+        _definitions[entry["assistant_id"]] = dict(model=model, instructions=instructions, tools=tools, path=path, **kwargs)
+        return entry["assistant_id"]
+
+def forget_assistant(assistant_id, path=ASSISTANT_REGISTRY_PATH):
+    # Drop an entry whose assistant no longer exists remotely
+    with _lock:
+        registry = load_registry(path)
+        registry = {key: entry for key, entry in registry.items() if entry["assistant_id"] != assistant_id}
+        save_registry(registry, path)
+
+def recreate_assistant(client, assistant_id):
+    # For an assistant that was deleted remotely (by hand, or by another checkout's
+    # collect_garbage): drop its entry and create it again from the same definition
+    definition = _definitions.get(assistant_id)
+    if definition is None:
+        return None
+    forget_assistant(assistant_id, definition["path"])
+    return get_assistant_id(client, **definition)
+
+def collect_garbage(client, max_age_days=ASSISTANT_REGISTRY_TTL_DAYS, path=ASSISTANT_REGISTRY_PATH):
+    # Delete assistants that have not been used for max_age_days, locally and remotely
+    cutoff = time.time() - max_age_days * 86400
+    removed = []
+    with _lock:
+        registry = load_registry(path)
+        for key, entry in list(registry.items()):
+            if entry.get("last_used", entry.get("created_at", 0)) >= cutoff:
+                continue
+            try:
+                client.beta.assistants.delete(entry["assistant_id"])
+            except Exception as e:
+                # Already gone remotely; still drop it from the store
+                if getattr(e, "status_code", None) != 404:
+                    continue
+            removed.append(entry["assistant_id"])
+            del registry[key]
+        save_registry(registry, path)
+    return removed
+
+# Example usage
+if __name__ == "__main__":
+    from openai_client import get_client
+    removed = collect_garbage(get_client())
+    print(f"Removed {len(removed)} stale assistants: {removed}")
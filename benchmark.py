@@ -0,0 +1,128 @@
+import json
+import time
+import argparse
+from collections import defaultdict
+from rich.console import Console
+from rich.table import Table
+from replay_harness import MeasuringTransport, RecordingTransport, ReplayServer, ReplayTransport, install_transport
+
+# End-to-end latency benchmark for master_agent over the sample tasks in input_file.py.
+#   python benchmark.py live                      # live API calls
+#   python benchmark.py record recordings.jsonl   # live API calls, recorded
+#   python benchmark.py replay recordings.jsonl   # replayed from a local server
+
+console = Console()
+
+def interval_union(intervals):
+    # Total time covered by at least one API call, so concurrent calls are not double counted
+    total = 0.0
+    current_start = current_end = None
+    for started, ended in sorted(intervals):
+        if current_end is None or started > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = started, ended
+        else:
+            current_end = max(current_end, ended)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+def measure_task(task, transport):
+    import plan_executor
+    import run_driver
+    from master_agent import master_agent
+
+    first_call = len(transport.calls)
+    first_step = plan_executor.step_count
+    first_wait = run_driver.wait_count
+
+    started = time.perf_counter()
+    master_agent(task)
+    end_to_end = time.perf_counter() - started
+
+    calls = transport.calls[first_call:]
+    steps = plan_executor.steps_since(first_step)
+    waits = run_driver.waits_since(first_wait)
+
+    agents = defaultdict(float)
+    for step in steps:
+        agents[step["agent"]] += step["seconds"]
+    requests_by_host = defaultdict(int)
+    for call in calls:
+        requests_by_host[call["host"]] += 1
+    api_seconds = interval_union([(call["started"], call["ended"]) for call in calls])
+
+    return {
+        "task": task.strip()[:60],
+        "end_to_end_seconds": round(end_to_end, 3),
+        "api_seconds": round(api_seconds, 3),
+        "overhead_seconds": round(end_to_end - api_seconds, 3),
+        "requests": len(calls),
+        "requests_by_host": dict(requests_by_host),
+        "polls": sum(wait["polls"] for wait in waits),
+        "agent_seconds": {agent: round(seconds, 3) for agent, seconds in agents.items()}
+    }
+
+def print_results(results):
+    table = Table(title="master_agent benchmark")
+    table.add_column("Task")
+    table.add_column("End to end (s)", justify="right")
+    table.add_column("API (s)", justify="right")
+    table.add_column("Overhead (s)", justify="right")
+    table.add_column("Requests", justify="right")
+    table.add_column("Polls", justify="right")
+    table.add_column("Per agent (s)")
+    for result in results:
+        table.add_row(
+            result["task"],
+            f"{result['end_to_end_seconds']:.3f}",
+            f"{result['api_seconds']:.3f}",
+            f"{result['overhead_seconds']:.3f}",
+            str(result["requests"]),
+            str(result["polls"]),
+            ", ".join(f"{agent}={seconds:.3f}" for agent, seconds in result["agent_seconds"].items())
+        )
+    console.print(table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark master_agent on the sample tasks")
+    parser.add_argument("mode", choices=["live", "record", "replay"])
+    parser.add_argument("recording", nargs="?", help="JSON-lines recording file (record and replay modes)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply recorded latencies on replay")
+    parser.add_argument("--fixed-latency", type=float, default=None, help="Use this latency (seconds) for every replayed call")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+    if args.mode != "live" and not args.recording:
+        parser.error(f"{args.mode} mode needs a recording file")
+
+    server = None
+    if args.mode == "record":
+        transport = MeasuringTransport(RecordingTransport(args.recording))
+    elif args.mode == "replay":
+        server = ReplayServer(args.recording, latency_scale=args.latency_scale, fixed_latency=args.fixed_latency).start()
+        transport = MeasuringTransport(ReplayTransport(server.url))
+    else:
+        transport = MeasuringTransport()
+    install_transport(transport)
+
+    from input_file import sample_tasks
+    results = []
+    try:
+        for _ in range(args.repeat):
+            for task in sample_tasks:
+                results.append(measure_task(task, transport))
+    finally:
+        if server is not None:
+            server.stop()
+            if server.misses:
+                console.print(f"[yellow]{len(server.misses)} requests had no recording[/yellow]")
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import CHART_ARTIFACT_DIR, CHART_WORKERS, CHART_MAX_POINTS, CHART_MAX_CATEGORIES
+
+# Charts are drawn with the object-oriented Agg API (no pyplot global state) in a
+# process pool, written to CHART_ARTIFACT_DIR and referenced by path.
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the pool is first created from a tool worker thread
+            # while other threads hold locks, and a forked child could inherit them held
+            _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def split_data(data):
+    if isinstance(data, dict):
+        return [str(label) for label in data.keys()], [float(value) for value in data.values()]
+    return [str(index) for index in range(len(data))], [float(value) for value in data]
+
+def downsample(labels, values, max_points=CHART_MAX_POINTS):
+    # Split the series into equal buckets and keep each bucket's min and max so peaks survive.
+    # Returns the kept points' original indices too, so they are plotted where they were.
+    if len(values) <= max_points:
+        return list(range(len(values))), labels, values
+    bucket_size = len(values) / (max_points // 2)
+    indices = set()
+    for bucket in range(max_points // 2):
+        start = int(bucket * bucket_size)
+        end = min(len(values), int((bucket + 1) * bucket_size))
+        window = range(start, end)
+        indices.add(min(window, key=lambda index: values[index]))
+        indices.add(max(window, key=lambda index: values[index]))
+    indices = sorted(indices)
+    return indices, [labels[index] for index in indices], [values[index] for index in indices]
+
+def top_categories(labels, values, max_categories=CHART_MAX_CATEGORIES):
+    # Bar and pie charts keep the largest categories and fold the rest into "Other"
+    if len(values) <= max_categories:
+        return labels, values
+    ranked = sorted(zip(labels, values), key=lambda item: -abs(item[1]))
+    kept = ranked[:max_categories - 1]
+    other = sum(value for _, value in ranked[max_categories - 1:])
+    return [label for label, _ in kept] + ["Other"], [value for _, value in kept] + [other]
+
+def chart_path(chart_type, data, artifact_dir=CHART_ARTIFACT_DIR):
+    # Identical charts map to the same file, so they are only rendered once
+    key = json.dumps({"chart_type": chart_type, "data": data}, sort_keys=True, default=str)
+    return os.path.join(artifact_dir, f"{chart_type}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.png")
+
+def render_chart(chart_type, data, path):
+    # Runs in a worker process
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    labels, values = split_data(data)
+    if chart_type in ("bar", "pie"):
+        labels, values = top_categories(labels, values)
+    else:
+        positions, labels, values = downsample(labels, values)
+
+    figure = Figure(figsize=(10, 6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    if chart_type == "bar":
+        axes.bar(labels, values)
+    elif chart_type == "line":
+        axes.plot(positions, values)
+    elif chart_type == "scatter":
+        axes.scatter(positions, values)
+    elif chart_type == "pie":
+        axes.pie(values, labels=labels)
+    else:
+        raise ValueError(f"Unsupported chart type: {chart_type}")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    figure.savefig(tmp_path, format="png")
+    os.replace(tmp_path, path)
+    return path
+
+def submit_chart(chart_type, data):
+    # Returns a future for the chart's file path
+    path = chart_path(chart_type, data)
+    return get_pool().submit(render_chart, chart_type, data, path)
+
+def generate_chart(chart_type, data):
+    path = chart_path(chart_type, data)
+    if os.path.exists(path):
+        return path
+    return submit_chart(chart_type, data).result()
+
+def generate_charts(requests):
+    # Render several (chart_type, data) requests in parallel; paths keep the request order
+    futures = [submit_chart(chart_type, data) for chart_type, data in requests]
+    return [future.result() for future in futures]
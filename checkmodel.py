@@ -1,8 +1,8 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY
+from openai_client import get_client, connection_stats
 
-# Pass the API key directly when initializing the client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Use the shared pooled client
+client = get_client()
 
 client.models.list()
-print(client.models.list())
\ No newline at end of file
+print(client.models.list())
+print(connection_stats())
\ No newline at end of file
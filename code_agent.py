@@ -1,52 +1,52 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-import time
-from config import OPENAI_API_KEY
+from openai_client import get_client
+from assistant_registry import get_assistant_id
+from run_driver import run_with_tools, add_user_message, agent_engine, run_chat
+from model_router import route
+from token_budget import count_tokens
+from artifact_store import FETCH_ARTIFACT_TOOL, fetch_handler
 load_dotenv(override=True)
 
+# Capability this agent needs from the model router
+CAPABILITY = "code"
+
 def run_assistant(prompt, execute_code=False):
 	# Set API key directly
-	client = OpenAI(api_key=OPENAI_API_KEY)
+	client = get_client()
 
 	# Adjust assistant instructions to emphasize using provided information
 	assistant_instructions = (
-		"You are an expert programmer. Use all provided information, such as image URLs or other data, to write code that accomplishes the task."
+		"You are an expert programmer. Use all provided information, such as image URLs or other data, to write code that accomplishes the task. "
+		"Earlier step outputs may be given as artifact handles with a summary; fetch the full content when you need it."
 	)  # Fixed string termination
 
 	# Choose tools based on whether we need to execute code
 	tools = [{"type": "code_interpreter"}] if execute_code else []
+	tools.append(FETCH_ARTIFACT_TOOL)
+	models = route(CAPABILITY, count_tokens(prompt))
+
+	# Without code_interpreter the agent can run as a local chat loop
+	if agent_engine("code", tools) == "chat":
+		return run_chat(client, models, assistant_instructions, tools, prompt, {"fetch_artifact": fetch_handler})
 
-	# Create an assistant with the injected prompt
-	assistant = client.beta.assistants.create(
+	# Get (or create once) an assistant with the injected prompt
+	assistant_id = get_assistant_id(
+		client,
 		name="Code Generator",
 		instructions=assistant_instructions,
 		tools=tools,
-		model="gpt-4o"
+		model=models[0]
 	)
 
 	# Create a Thread
 	thread = client.beta.threads.create()
 
 	# Add the user's prompt to the thread
-	client.beta.threads.messages.create(
-		thread_id=thread.id,
-		role="user",
-		content=prompt
-	)
-
-	# Create a Run
-	run = client.beta.threads.runs.create(
-		thread_id=thread.id,
-		assistant_id=assistant.id
-	)
+	add_user_message(client, thread.id, prompt)
 
-	# Wait for the run to complete
-	while True:
-		run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-		if run_status.status in ['completed', 'failed', 'requires_action']:
-			break
-		time.sleep(1)
+	# Create a Run and answer its artifact fetches; raises unless it completes
+	run_with_tools(client, thread.id, assistant_id, {"fetch_artifact": fetch_handler})
 
 	# Retrieve and return the assistant's response
 	messages = client.beta.threads.messages.list(thread_id=thread.id)
@@ -1,2 +1,193 @@
 OPENAI_API_KEY = "..."
-REPLICATE_API_TOKEN = "..."  
\ No newline at end of file
+REPLICATE_API_TOKEN = "..."
+
+# Maximum number of independent plan steps the master agent runs at once
+MAX_PLAN_WORKERS = 4
+# Most recent step and run-wait records kept in memory (plan_executor.step_log, run_driver.wait_log)
+STEP_LOG_SIZE = 1000
+WAIT_LOG_SIZE = 1000
+# Stream the planner response and start steps before the whole plan has arrived
+PLAN_STREAMING = True
+
+# Local store of assistant ids reused across steps and processes
+ASSISTANT_REGISTRY_PATH = ".assistant_registry.json"
+ASSISTANT_REGISTRY_TTL_DAYS = 30
+
+# Run completion: stream run events when possible, otherwise poll with backoff (seconds)
+RUN_STREAMING = True
+RUN_POLL_INITIAL_INTERVAL = 0.1
+RUN_POLL_MAX_INTERVAL = 2.0
+RUN_POLL_BACKOFF = 1.5
+
+# Tool calls within one requires_action round run concurrently, bounded per tool
+TOOL_MAX_WORKERS = 8
+TOOL_CONCURRENCY_LIMITS = {
+    "generate_image": 8,
+    "download_image": 8,
+    "write_file": 1,
+    "append_file": 1,
+    "patch_file": 1
+}
+MAX_TOOL_ROUNDS = 10
+# Per-agent engine: "chat" runs the agent's tools in a local chat.completions loop, "assistants"
+# uses an assistant, thread and run. Agents with hosted tools (code_interpreter) always use runs.
+AGENT_ENGINES = {
+    "file": "chat",
+    "image": "chat",
+    "code": "chat",
+    "query_builder": "chat",
+    "validator": "chat",
+    "reporter": "chat"
+}
+DEFAULT_AGENT_ENGINE = "assistants"
+
+# Shared OpenAI HTTP client: connection pool and timeouts (seconds)
+OPENAI_MAX_CONNECTIONS = 20
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 10
+OPENAI_KEEPALIVE_EXPIRY = 60
+OPENAI_TIMEOUT = 120
+OPENAI_CONNECT_TIMEOUT = 10
+
+# Context sent to the data agents: token budget, sample rows per DataFrame, cached descriptions
+CONTEXT_TOKEN_BUDGET = 4000
+CONTEXT_SAMPLE_ROWS = 5
+CONTEXT_CACHE_SIZE = 64
+
+# CSV loading: parser engine ("auto" picks pyarrow when installed) and parsed-data cache
+CSV_ENGINE = "auto"
+CSV_CACHE_DIR = ".cache/csv"
+
+# Parallel file loading: worker count and memory admission limit.
+# A file is assumed to need DATA_LOADER_MEMORY_FACTOR times its size on disk while loading.
+DATA_LOADER_WORKERS = 4
+DATA_LOADER_MEMORY_LIMIT_MB = 2048
+DATA_LOADER_MEMORY_FACTOR = 5
+
+# Number of query results kept by the local query engine
+QUERY_CACHE_SIZE = 256
+
+# Planner cache: in-memory LRU entries, on-disk entries and time to live (seconds)
+PLAN_CACHE_DIR = ".cache/plans"
+PLAN_CACHE_SIZE = 128
+PLAN_CACHE_DISK_SIZE = 1024
+PLAN_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Tracing: spans for planning, steps, API calls, polls and tools, exported as JSON lines
+TRACING_ENABLED = True
+TRACE_PATH = ".traces/trace.jsonl"
+
+# Token budgets: per agent step and per task. Over budget steps get their context compacted.
+TOKEN_MODEL = "gpt-4o-mini"
+STEP_TOKEN_BUDGET = 16000
+TASK_TOKEN_BUDGET = 100000
+MIN_STEP_TOKENS = 2000
+MIN_CONTEXT_TOKENS = 500
+
+# Chart rendering: worker processes, output directory and downsampling limits
+CHART_ARTIFACT_DIR = "artifacts/charts"
+CHART_WORKERS = 4
+CHART_MAX_POINTS = 2000
+CHART_MAX_CATEGORIES = 30
+
+# Image generation: model, predictions in flight, content-addressed store and polling (seconds)
+IMAGE_MODEL = "black-forest-labs/flux-dev"
+IMAGE_MAX_CONCURRENT = 4
+IMAGE_STORE_DIR = ".cache/images"
+IMAGE_URL_TTL_SECONDS = 3600
+IMAGE_POLL_INITIAL_INTERVAL = 0.5
+IMAGE_POLL_MAX_INTERVAL = 3.0
+# Give up on a prediction after this many failed status checks in a row, or after this long
+IMAGE_POLL_MAX_FAILURES = 5
+IMAGE_PREDICTION_TIMEOUT_SECONDS = 600
+
+# Downloads: shared session pool, parallel workers, size limit and timeouts (seconds)
+DOWNLOAD_POOL_SIZE = 16
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_MAX_BYTES = 50 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_CONNECT_TIMEOUT = 10
+DOWNLOAD_READ_TIMEOUT = 60
+
+# read_file returns at most this many bytes; larger files are read in ranges
+FILE_READ_MAX_BYTES = 200 * 1024
+
+# Step outputs longer than ARTIFACT_INLINE_CHARS are stored once and passed on as handles
+ARTIFACT_DIR = ".cache/artifacts"
+ARTIFACT_INLINE_CHARS = 500
+ARTIFACT_SUMMARY_CHARS = 200
+ARTIFACT_FETCH_MAX_CHARS = 20000
+
+# Job queue and worker service (job_queue.py)
+JOB_DB_PATH = ".jobs.sqlite"
+JOB_WORKERS = 4
+JOB_POLL_INTERVAL = 1.0
+# Running jobs older than this are assumed to belong to a dead worker and are requeued
+JOB_STALE_SECONDS = 3600
+JOB_MAX_ATTEMPTS = 3
+
+# Shared API request layer (rate_limiter.py). Limits are per provider and per "provider:model";
+# a request waits for both its provider's and its model's bucket
+RATE_LIMITS = {
+    "openai": {"requests_per_minute": 3000, "burst": 50},
+    "openai:gpt-4o": {"requests_per_minute": 500},
+    "openai:gpt-4o-mini": {"requests_per_minute": 500},
+    "openai:chatgpt-4o-latest": {"requests_per_minute": 200},
+    "replicate": {"requests_per_minute": 3000, "burst": 50},
+    f"replicate:{IMAGE_MODEL}": {"requests_per_minute": 600}
+}
+# Buckets never slow below this fraction of their configured rate
+RATE_LIMIT_MIN_FRACTION = 0.1
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# Consecutive failures before a provider's circuit opens, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS = 30
+
+# Model router (model_router.py). Each capability's pool is listed in order of preference
+CAPABILITY_MODELS = {
+    "planning": ["chatgpt-4o-latest", "gpt-4o"],
+    "code": ["gpt-4o", "gpt-4o-mini"],
+    "analysis": ["gpt-4o-mini", "gpt-4o"],
+    "tools": ["gpt-4o-mini", "gpt-4o"]
+}
+# Higher tiers are stronger; prompts over ROUTER_LARGE_PROMPT_TOKENS go to the highest tier first
+MODEL_TIERS = {
+    "chatgpt-4o-latest": 2,
+    "gpt-4o": 2,
+    "gpt-4o-mini": 1
+}
+# Capabilities whose small prompts go to the model with the lowest observed p50 latency
+ROUTER_LATENCY_CAPABILITIES = ["tools", "analysis"]
+MODEL_CONTEXT_TOKENS = {
+    "chatgpt-4o-latest": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000
+}
+ROUTER_LARGE_PROMPT_TOKENS = 8000
+# Rolling window of calls per model, and how many are needed before latency reorders the pool
+ROUTER_WINDOW = 50
+ROUTER_MIN_SAMPLES = 5
+# Share of latency-routed calls that try another model first, so every model in the pool keeps fresh samples
+ROUTER_EXPLORE_RATE = 0.05
+# A model is degraded above this error rate or p95 latency and is only tried after healthy ones
+ROUTER_MAX_ERROR_RATE = 0.25
+ROUTER_MAX_P95_SECONDS = 60
+ROUTER_STATS_PATH = ".cache/model_stats.json"
+ROUTER_SAVE_INTERVAL = 5
+
+# Check query results with local rules (result_validators.py) before asking the LLM validator;
+# a result is accepted locally only when at least VALIDATOR_MIN_PASSES rules pass
+VALIDATOR_LOCAL_RULES = True
+VALIDATOR_MIN_PASSES = 2
+
+# Column profiling (data_profiler.py). Profiles are cached in CSV_CACHE_DIR by file fingerprint;
+# bump PROFILE_VERSION when the profile format changes
+PROFILE_VERSION = 1
+PROFILE_CHUNK_ROWS = 100000
+# 2^12 HyperLogLog registers, about 1.6% standard error on distinct counts
+PROFILE_HLL_PRECISION = 12
+PROFILE_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+PROFILE_SKETCH_POINTS = 101
+PROFILE_TOP_K = 5
@@ -0,0 +1,147 @@
+import json
+import weakref
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_SAMPLE_ROWS, CONTEXT_CACHE_SIZE, MIN_CONTEXT_TOKENS
+from token_budget import count_tokens, current_allowance, truncate_text
+
+# Turns agent context (which may hold raw DataFrames) into a compact JSON description
+# that fits in a token budget. DataFrame descriptions are cached per DataFrame version.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# DataFrames from the data loader: id -> (weak reference, version, column profiles)
+_registered = {}
+
+# Progressively less detailed renderings: (sample rows, column stats, max string length)
+DETAIL_LEVELS = [
+    (CONTEXT_SAMPLE_ROWS, True, None),
+    (min(CONTEXT_SAMPLE_ROWS, 2), True, 2000),
+    (0, True, 500),
+    (0, False, 200)
+]
+
+def estimate_tokens(text):
+    return count_tokens(text)
+
+def dataframe_version(df):
+    # Identifies the content of a DataFrame, so caches notice in-place changes
+    try:
+        content_hash = int(pd.util.hash_pandas_object(df, index=True).sum())
+    except TypeError:
+        content_hash = id(df)  # Unhashable cell values (lists, dicts)
+    return (df.shape, tuple(str(column) for column in df.columns), content_hash)
+
+def register_dataframe(df, profiles=None):
+    # Registers a loaded DataFrame: its version is pinned, and column profiles computed
+    # for it are used in its description in place of column_stats
+    key = id(df)
+
+    def forget(ref):
+        with _cache_lock:
+            if key in _registered and _registered[key][0] is ref:
+                del _registered[key]
+
+    entry = (weakref.ref(df, forget), dataframe_version(df), profiles)
+    with _cache_lock:
+        _registered[key] = entry
+
+def registered(df):
+    with _cache_lock:
+        entry = _registered.get(id(df))
+    return entry if entry is not None and entry[0]() is df else None
+
+def loaded_version(df):
+    # Loaded DataFrames are not modified in place (queries cannot), so their version is
+    # computed once at load time rather than by hashing every row on each lookup
+    entry = registered(df)
+    return entry[1] if entry is not None else dataframe_version(df)
+
+def column_stats(series):
+    stats = {
+        "dtype": str(series.dtype),
+        "null_count": int(series.isna().sum())
+    }
+    non_null = series.dropna()
+    if non_null.empty:
+        return stats
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        stats.update({
+            "min": to_jsonable(non_null.min()),
+            "max": to_jsonable(non_null.max()),
+            "mean": round(float(non_null.mean()), 4),
+            "std": round(float(non_null.std()), 4) if len(non_null) > 1 else 0.0
+        })
+    else:
+        try:
+            counts = non_null.value_counts()
+            stats["distinct"] = int(len(counts))
+            stats["top"] = {str(value): int(count) for value, count in counts.head(3).items()}
+        except TypeError:
+            pass
+    return stats
+
+def describe_dataframe(df):
+    version = loaded_version(df)
+    key = id(df)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    entry = registered(df)
+    profiles = entry[2] if entry is not None else None
+    description = {
+        "type": "DataFrame",
+        "num_rows": int(df.shape[0]),
+        "num_columns": int(df.shape[1]),
+        "columns": profiles or {str(column): column_stats(df[column]) for column in df.columns},
+        "sample_rows": json.loads(df.head(CONTEXT_SAMPLE_ROWS).to_json(orient="records", date_format="iso", default_handler=str))
+    }
+    with _cache_lock:
+        _cache[key] = (version, description)
+        _cache.move_to_end(key)
+        while len(_cache) > CONTEXT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return description
+
+def to_jsonable(value, sample_rows=CONTEXT_SAMPLE_ROWS, include_stats=True, max_string=None):
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        description = dict(describe_dataframe(value))
+        description["sample_rows"] = description["sample_rows"][:sample_rows]
+        if not include_stats:
+            description["columns"] = {column: stats["dtype"] for column, stats in description["columns"].items()}
+        return description
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item, sample_rows, include_stats, max_string) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item, sample_rows, include_stats, max_string) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (np.dtype, pd.api.extensions.ExtensionDtype)):
+        value = str(value)
+    if isinstance(value, float) and not np.isfinite(value):
+        value = None
+    if value is not None and not isinstance(value, (str, int, float, bool)):
+        value = str(value)
+    if isinstance(value, str) and max_string is not None and len(value) > max_string:
+        value = value[:max_string] + f"... [{len(value) - max_string} more characters]"
+    return value
+
+def serialize_context(context, token_budget=CONTEXT_TOKEN_BUDGET, indent=None):
+    # Use the most detailed rendering that fits; truncate as a last resort
+    text = ''
+    for sample_rows, include_stats, max_string in DETAIL_LEVELS:
+        text = json.dumps(to_jsonable(context, sample_rows, include_stats, max_string), indent=indent)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    return truncate_text(text, token_budget)
+
+def fit_context(context, reserved_text="", indent=None):
+    # Serialize context into whatever the current step allowance leaves after reserved_text
+    budget = min(CONTEXT_TOKEN_BUDGET, current_allowance() - count_tokens(reserved_text))
+    return serialize_context(context, token_budget=max(MIN_CONTEXT_TOKENS, budget), indent=indent)
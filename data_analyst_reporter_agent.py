@@ -1,105 +1,80 @@
 import os
-from openai import OpenAI
-import time
+from openai_client import get_client
 import json
-import matplotlib.pyplot as plt
-import io
-import base64
-from config import OPENAI_API_KEY
+from assistant_registry import get_assistant_id
+from run_driver import run_with_tools, add_user_message, agent_engine, run_chat
+from model_router import route
+from token_budget import count_tokens
+from context_serializer import fit_context
+from artifact_store import FETCH_ARTIFACT_TOOL, fetch_handler
+from chart_renderer import generate_chart
 
-def run_assistant(context):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    assistant = client.beta.assistants.create(
-        instructions=(
-            "You are a data analyst reporter. Generate a comprehensive report on the analysis, "
-            "including key findings, interpretation of results, and recommendations."
-        ),
-        model="gpt-4o-mini",
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "generate_visualization",
-                    "description": "Generate a visualization based on the query result",
-                    "parameters": {
+def generate_visualization(chart_type, data):
+    # Rendered off the calling thread; the model gets a short file reference, not inline base64
+    path = generate_chart(chart_type, data)
+    return json.dumps({"chart": path, "chart_type": chart_type})
+
+TOOL_HANDLERS = {
+    "generate_visualization": lambda arguments: generate_visualization(arguments["chart_type"], arguments["data"]),
+    "fetch_artifact": fetch_handler
+}
+
+INSTRUCTIONS = (
+    "You are a data analyst reporter. Generate a comprehensive report on the analysis, "
+    "including key findings, interpretation of results, and recommendations. "
+    "Visualizations are saved as files; reference them by their returned path. "
+    "Large results are given as artifact handles with a summary; fetch them for the full data."
+)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "generate_visualization",
+            "description": "Generate a visualization based on the query result",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "chart_type": {
+                        "type": "string",
+                        "enum": ["bar", "line", "scatter", "pie"],
+                        "description": "The type of chart to generate"
+                    },
+                    "data": {
                         "type": "object",
-                        "properties": {
-                            "chart_type": {
-                                "type": "string",
-                                "enum": ["bar", "line", "scatter", "pie"],
-                                "description": "The type of chart to generate"
-                            },
-                            "data": {
-                                "type": "object",
-                                "description": "The data to visualize"
-                            }
-                        },
-                        "required": ["chart_type", "data"]
+                        "description": "The data to visualize"
                     }
-                }
+                },
+                "required": ["chart_type", "data"]
             }
-        ]
-    )
+        }
+    },
+    FETCH_ARTIFACT_TOOL
+]
 
-    thread = client.beta.threads.create()
+# Capability this agent needs from the model router
+CAPABILITY = "analysis"
 
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=f"Generate a report based on this context: {json.dumps(context)}"
-    )
+def run_assistant(context):
+    client = get_client()
+    content = f"Generate a report based on this context: {fit_context(context)}"
+    models = route(CAPABILITY, count_tokens(content))
 
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant.id
-    )
+    if agent_engine("reporter", TOOLS) == "chat":
+        return run_chat(client, models, INSTRUCTIONS, TOOLS, content, TOOL_HANDLERS)
 
-    while True:
-        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run_status.status in ['completed', 'failed', 'requires_action']:
-            break
-        time.sleep(1)
+    assistant_id = get_assistant_id(
+        client,
+        instructions=INSTRUCTIONS,
+        model=models[0],
+        tools=TOOLS
+    )
 
-    if run_status.status == 'requires_action':
-        tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
-        tool_outputs = []
-        for tool_call in tool_calls:
-            if tool_call.function.name == "generate_visualization":
-                arguments = json.loads(tool_call.function.arguments)
-                plt.figure(figsize=(10, 6))
-                if arguments["chart_type"] == "bar":
-                    plt.bar(arguments["data"].keys(), arguments["data"].values())
-                elif arguments["chart_type"] == "line":
-                    plt.plot(list(arguments["data"].values()))
-                elif arguments["chart_type"] == "scatter":
-                    plt.scatter(range(len(arguments["data"])), list(arguments["data"].values()))
-                elif arguments["chart_type"] == "pie":
-                    plt.pie(arguments["data"].values(), labels=arguments["data"].keys())
-                
-                buffer = io.BytesIO()
-                plt.savefig(buffer, format="png")
-                buffer.seek(0)
-                image_base64 = base64.b64encode(buffer.getvalue()).decode()
-                plt.close()
-                
-                output = f"<img src='data:image/png;base64,{image_base64}' alt='Visualization'>"
-            tool_outputs.append({
-                "tool_call_id": tool_call.id,
-                "output": output
-            })
+    thread = client.beta.threads.create()
 
-        client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread.id,
-            run_id=run.id,
-            tool_outputs=tool_outputs
-        )
+    add_user_message(client, thread.id, content)
 
-        while True:
-            run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-            if run_status.status == 'completed':
-                break
-            time.sleep(1)
+    run_with_tools(client, thread.id, assistant_id, TOOL_HANDLERS)
 
     messages = client.beta.threads.messages.list(thread_id=thread.id)
     report = ''
@@ -1,85 +1,85 @@
 import os
-from openai import OpenAI
-import time
+from openai_client import get_client
 import json
-from config import OPENAI_API_KEY
-def run_assistant(prompt, context):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    assistant = client.beta.assistants.create(
-        instructions=(
-            "You are a data analyst validator. Review the user's original prompt, examine the context "
-            "containing data information and query results, and validate if the executed query satisfies "
-            "the user's request."
-        ),
-        model="gpt-4o-mini",
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "validate_result",
-                    "description": "Validate if the query result satisfies the user's request",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "is_valid": {
-                                "type": "boolean",
-                                "description": "Whether the result is valid or not"
-                            },
-                            "message": {
-                                "type": "string",
-                                "description": "Explanation of the validation result"
-                            }
-                        },
-                        "required": ["is_valid", "message"]
+from assistant_registry import get_assistant_id
+from run_driver import run_with_tools, add_user_message, agent_engine, run_chat
+from model_router import route
+from token_budget import count_tokens
+from context_serializer import fit_context
+from result_validators import validate_locally
+from config import VALIDATOR_LOCAL_RULES
+from artifact_store import FETCH_ARTIFACT_TOOL, fetch_handler
+
+TOOL_HANDLERS = {
+    "validate_result": lambda arguments: json.dumps(arguments),
+    "fetch_artifact": fetch_handler
+}
+
+INSTRUCTIONS = (
+    "You are a data analyst validator. Review the user's original prompt, examine the context "
+    "containing data information and query results, and validate if the executed query satisfies "
+    "the user's request. Large results are given as artifact handles with a summary; fetch them when "
+    "the summary is not enough to decide."
+)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "validate_result",
+            "description": "Validate if the query result satisfies the user's request",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "is_valid": {
+                        "type": "boolean",
+                        "description": "Whether the result is valid or not"
+                    },
+                    "message": {
+                        "type": "string",
+                        "description": "Explanation of the validation result"
                     }
-                }
+                },
+                "required": ["is_valid", "message"]
             }
-        ]
-    )
+        }
+    },
+    FETCH_ARTIFACT_TOOL
+]
 
-    thread = client.beta.threads.create()
+# Capability this agent needs from the model router
+CAPABILITY = "tools"
 
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=f"Original prompt: {prompt}\n\nContext: {json.dumps(context)}"
-    )
+def run_assistant(prompt, context):
+    # Local rules decide most results in milliseconds; only undecided ones need the model
+    if VALIDATOR_LOCAL_RULES:
+        verdict = validate_locally(prompt, context)
+        if verdict is not None:
+            return json.dumps(verdict)
 
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant.id
-    )
+    client = get_client()
+    content = f"Original prompt: {prompt}\n\nContext: {fit_context(context, prompt)}"
+    models = route(CAPABILITY, count_tokens(content))
 
-    while True:
-        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run_status.status in ['completed', 'failed', 'requires_action']:
-            break
-        time.sleep(1)
+    if agent_engine("validator", TOOLS) == "chat":
+        # The verdict is taken from the tool call itself rather than the closing message
+        verdicts = []
+        handlers = {**TOOL_HANDLERS, "validate_result": lambda arguments: verdicts.append(arguments) or json.dumps(arguments)}
+        text = run_chat(client, models, INSTRUCTIONS, TOOLS, content, handlers)
+        return json.dumps(verdicts[-1]) if verdicts else text
 
-    if run_status.status == 'requires_action':
-        tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
-        tool_outputs = []
-        for tool_call in tool_calls:
-            if tool_call.function.name == "validate_result":
-                arguments = json.loads(tool_call.function.arguments)
-                output = arguments
-            tool_outputs.append({
-                "tool_call_id": tool_call.id,
-                "output": json.dumps(output)
-            })
+    assistant_id = get_assistant_id(
+        client,
+        instructions=INSTRUCTIONS,
+        model=models[0],
+        tools=TOOLS
+    )
+
+    thread = client.beta.threads.create()
 
-        client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread.id,
-            run_id=run.id,
-            tool_outputs=tool_outputs
-        )
+    add_user_message(client, thread.id, content)
 
-        while True:
-            run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-            if run_status.status == 'completed':
-                break
-            time.sleep(1)
+    run_with_tools(client, thread.id, assistant_id, TOOL_HANDLERS)
 
     messages = client.beta.threads.messages.list(thread_id=thread.id)
     validation_result = ''
@@ -1,10 +1,61 @@
 import pandas as pd
 import os
 import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from context_serializer import serialize_context, register_dataframe
+from data_profiler import profile_dataframe, ColumnProfiles
+from config import (
+    CSV_ENGINE, CSV_CACHE_DIR, DATA_LOADER_WORKERS, DATA_LOADER_MEMORY_LIMIT_MB, DATA_LOADER_MEMORY_FACTOR,
+    PROFILE_VERSION
+)
 
-def load_csv(file_path):
+try:
+    import pyarrow  # Enables the multithreaded CSV parser and the Parquet cache
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+def csv_engine(engine=CSV_ENGINE):
+    if engine == "auto":
+        return "pyarrow" if HAS_PYARROW else "c"
+    return engine
+
+def cache_path(file_path, dtype=None):
+    # Cache entries are keyed by path, size and mtime, so edited files are re-parsed
+    stat = os.stat(file_path)
+    key = json.dumps([os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, dtype], sort_keys=True, default=str)
+    return os.path.join(CSV_CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".parquet")
+
+def write_cache(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
     try:
-        df = pd.read_csv(file_path)
+        df.to_parquet(tmp_path, engine="pyarrow")
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)  # Caching is best effort
+
+def load_csv(file_path, dtype=None, usecols=None, engine=CSV_ENGINE, use_cache=True):
+    try:
+        use_cache = use_cache and HAS_PYARROW and CSV_CACHE_DIR is not None
+        if use_cache:
+            cached = cache_path(file_path, dtype)
+            if os.path.exists(cached):
+                # Memory-map the cached columns instead of parsing the CSV text again
+                return pd.read_parquet(cached, engine="pyarrow", columns=usecols, memory_map=True)
+
+        engine = csv_engine(engine)
+        # The full file is cached so later loads can prune any columns they like
+        df = pd.read_csv(file_path, engine=engine, dtype=dtype, usecols=None if use_cache else usecols)
+        if use_cache:
+            write_cache(df, cached)
+            if usecols is not None:
+                df = df[list(usecols)]
         return df
     except Exception as e:
         return f"Error loading CSV file: {str(e)}"
@@ -12,31 +63,116 @@ def load_csv(file_path):
 def get_column_data_types(df):
     return df.dtypes.to_dict()
 
-def get_basic_insights(df):
+def profile_cache_path(file_path):
+    # Profiles sit next to the Parquet cache under the same file fingerprint
+    return cache_path(file_path)[:-len(".parquet")] + f".profile-v{PROFILE_VERSION}.json"
+
+def read_profile(path):
+    try:
+        with open(path, 'r') as file:
+            profile = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    profile["columns"] = ColumnProfiles(profile["columns"])
+    return profile
+
+def get_profile(df, file_path=None):
+    cached = profile_cache_path(file_path) if file_path is not None and CSV_CACHE_DIR is not None else None
+    profile = read_profile(cached) if cached is not None and os.path.exists(cached) else None
+    if profile is not None:
+        return profile
+    profile = profile_dataframe(df)
+    if cached is not None:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cached), suffix=".tmp")
+            with os.fdopen(fd, 'w') as file:
+                json.dump(profile, file)
+            os.replace(tmp_path, cached)
+        except OSError:
+            pass  # Caching is best effort
+    return profile
+
+def get_basic_insights(df, file_path=None):
+    profile = get_profile(df, file_path)
+    # The serializer describes this DataFrame from the profile instead of recomputing its stats
+    register_dataframe(df, profile["columns"])
     insights = {
         "num_rows": df.shape[0],
         "num_columns": df.shape[1],
-        "column_data_types": get_column_data_types(df)
+        "column_data_types": get_column_data_types(df),
+        "columns": profile["columns"]
     }
     return insights
 
-def run_data_loader(file_paths):
+class MemoryBudget:
+    # Admits work only while the estimated memory of in-flight files fits the limit.
+    # A single file larger than the limit is still admitted once nothing else is running.
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.in_use = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, amount):
+        with self.condition:
+            while self.in_use > 0 and self.in_use + amount > self.limit_bytes:
+                self.condition.wait()
+            self.in_use += amount
+
+    def release(self, amount):
+        with self.condition:
+            self.in_use -= amount
+            self.condition.notify_all()
+
+def estimate_memory(file_path):
+    try:
+        return os.path.getsize(file_path) * DATA_LOADER_MEMORY_FACTOR
+    except OSError:
+        return 0
+
+def load_and_profile(file_path, budget):
+    timings = {}
+    amount = estimate_memory(file_path)
+    budget.acquire(amount)
+    try:
+        started = time.perf_counter()
+        df = load_csv(file_path)
+        timings["load_seconds"] = round(time.perf_counter() - started, 4)
+        insights = None
+        if not isinstance(df, str):  # Not an error message
+            started = time.perf_counter()
+            insights = get_basic_insights(df, file_path)
+            timings["profile_seconds"] = round(time.perf_counter() - started, 4)
+    finally:
+        budget.release(amount)
+    return df, insights, timings
+
+def run_data_loader(file_paths, max_workers=DATA_LOADER_WORKERS, memory_limit_mb=DATA_LOADER_MEMORY_LIMIT_MB):
     context = {
         "dataframes": {},
-        "insights": {}
+        "insights": {},
+        "timings": {}
     }
-    for file_path in file_paths:
+    file_paths = [file_path.strip() for file_path in file_paths if file_path.strip()]
+    if not file_paths:
+        return context
+
+    # Parsing releases the GIL, so threads load files in parallel without copying DataFrames
+    budget = MemoryBudget(memory_limit_mb * 1024 * 1024)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(file_paths)))) as executor:
+        loaded = list(executor.map(lambda file_path: load_and_profile(file_path, budget), file_paths))
+
+    # Merge in the order the files were given
+    for file_path, (df, insights, timings) in zip(file_paths, loaded):
         df_name = os.path.basename(file_path).split('.')[0]
-        df = load_csv(file_path)
-        if isinstance(df, str):  # Error message
-            context["dataframes"][df_name] = df
-        else:
-            context["dataframes"][df_name] = df
-            context["insights"][df_name] = get_basic_insights(df)
+        context["dataframes"][df_name] = df
+        context["timings"][df_name] = timings
+        if insights is not None:
+            context["insights"][df_name] = insights
     return context
 
 # Example usage
 if __name__ == "__main__":
     file_paths = ["sample_data.csv"]
     context = run_data_loader(file_paths)
-    print(json.dumps(context, indent=2))
\ No newline at end of file
+    print(serialize_context(context, indent=2))
\ No newline at end of file
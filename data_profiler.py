@@ -0,0 +1,222 @@
+import math
+from collections import Counter
+import numpy as np
+import pandas as pd
+from config import (
+    PROFILE_CHUNK_ROWS, PROFILE_HLL_PRECISION, PROFILE_QUANTILES, PROFILE_SKETCH_POINTS, PROFILE_TOP_K
+)
+
+# Column profiles built in one pass over the rows, chunk by chunk: null counts, min/max,
+# mean/std (merged across chunks), HyperLogLog distinct counts, a mergeable quantile
+# sketch and top-k frequent values. Each chunk is processed with vectorized numpy/pandas
+# operations, so memory stays bounded by the chunk size.
+
+def bit_length(values):
+    # Bit length of uint64 values, computed on exact 32-bit halves to avoid float rounding
+    def bits(halves):
+        out = np.zeros(len(halves), dtype=np.int64)
+        nonzero = halves > 0
+        out[nonzero] = np.floor(np.log2(halves[nonzero])).astype(np.int64) + 1
+        return out
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + bits(high), bits(low))
+
+def hash_values(series):
+    return pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+
+class HyperLogLog:
+    def __init__(self, precision=PROFILE_HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        rank = (width - bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / float(np.sum(np.power(2.0, -self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
+
+class QuantileSketch:
+    # Each chunk contributes PROFILE_SKETCH_POINTS evenly spaced quantiles weighted by its size;
+    # summaries are compressed once enough chunks have been added
+    def __init__(self, points=PROFILE_SKETCH_POINTS, max_summaries=32):
+        self.points = points
+        self.max_summaries = max_summaries
+        self.values = []
+        self.weights = []
+
+    def add(self, values):
+        if not len(values):
+            return
+        if len(values) <= self.points:
+            self.values.append(np.sort(values))
+            self.weights.append(np.ones(len(values)))
+        else:
+            self.values.append(np.quantile(values, np.linspace(0, 1, self.points)))
+            self.weights.append(np.full(self.points, len(values) / self.points))
+        if len(self.values) > self.max_summaries:
+            total = float(sum(weights.sum() for weights in self.weights))
+            merged = self.quantiles(np.linspace(0, 1, self.points * 4))
+            self.values = [merged]
+            self.weights = [np.full(len(merged), total / len(merged))]
+
+    def quantiles(self, fractions):
+        values = np.concatenate(self.values)
+        weights = np.concatenate(self.weights)
+        order = np.argsort(values, kind="stable")
+        values, weights = values[order], weights[order]
+        positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return np.interp(fractions, positions, values)
+
+class TopK:
+    # Keeps the most frequent values of each chunk and trims the merged counts, so rare
+    # values may be undercounted but frequent ones are exact or close
+    def __init__(self, k=PROFILE_TOP_K, capacity_factor=10):
+        self.k = k
+        self.capacity = k * capacity_factor
+        self.counts = Counter()
+
+    def add(self, series):
+        for value, count in series.value_counts().head(self.capacity).items():
+            self.counts[value] += int(count)
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity)))
+
+    def top(self):
+        return {str(value): count for value, count in self.counts.most_common(self.k)}
+
+def is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+def as_float(value):
+    value = float(value)
+    return round(value, 4) if math.isfinite(value) else None
+
+class ColumnProfile:
+    def __init__(self):
+        self.dtypes = set()
+        self.numeric = True
+        self.nulls = 0
+        self.non_null = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.distinct = HyperLogLog()
+        self.sketch = QuantileSketch()
+        self.frequent = TopK()
+
+    def add_moments(self, count, mean, variance, minimum, maximum):
+        # Chan et al. pairwise update of count, mean and sum of squared deviations
+        if not count:
+            return
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += variance * count + delta * delta * self.count * count / total
+        self.count = total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    def add(self, series, moments=None):
+        self.dtypes.add(str(series.dtype))
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        self.non_null += len(non_null)
+        if non_null.empty:
+            return
+        if is_numeric(series):
+            values = non_null.to_numpy(dtype=np.float64)
+            self.add_moments(*(moments or (len(values), values.mean(), values.var(), values.min(), values.max())))
+            self.sketch.add(values)
+            # Hash as float64 so chunks parsed as int and as float count the same values once
+            self.distinct.add_hashes(hash_values(pd.Series(values)))
+            self.frequent.add(pd.Series(values))
+        else:
+            self.numeric = False
+            text = non_null.astype(str)
+            self.distinct.add_hashes(hash_values(text))
+            self.frequent.add(text)
+
+    def dtype(self):
+        if len(self.dtypes) == 1:
+            return next(iter(self.dtypes))
+        if self.numeric:
+            return "float64"  # Some chunks had missing values and were parsed as float
+        return "object"
+
+    def summary(self):
+        stats = {
+            "dtype": self.dtype(),
+            "null_count": int(self.nulls),
+            "distinct": min(self.distinct.count(), self.non_null)
+        }
+        if self.numeric and self.count:
+            stats.update({
+                "min": as_float(self.min),
+                "max": as_float(self.max),
+                "mean": as_float(self.mean),
+                "std": as_float(math.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else 0.0,
+                "quantiles": {
+                    f"p{int(round(fraction * 100))}": as_float(value)
+                    for fraction, value in zip(PROFILE_QUANTILES, self.sketch.quantiles(PROFILE_QUANTILES))
+                }
+            })
+        # Frequent values only say something for categorical columns
+        if not self.numeric or stats["distinct"] <= PROFILE_TOP_K * 10:
+            stats["top"] = self.frequent.top()
+        return stats
+
+class ColumnProfiles(dict):
+    # Marks per-column profiles so the artifact store keeps them inline in the step context
+    pass
+
+def profile_chunks(chunks):
+    columns = {}
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        # Moments for every numeric column of the chunk in one vectorized call each
+        numeric = [column for column in chunk.columns if is_numeric(chunk[column])]
+        moments = {}
+        if numeric:
+            block = chunk[numeric].astype(np.float64)
+            counts, means, variances = block.count(), block.mean(), block.var(ddof=0)
+            minimums, maximums = block.min(), block.max()
+            for column in numeric:
+                moments[column] = (int(counts[column]), means[column], variances[column], minimums[column], maximums[column])
+        for column in chunk.columns:
+            columns.setdefault(column, ColumnProfile()).add(chunk[column], moments.get(column))
+    return {
+        "num_rows": rows,
+        "columns": ColumnProfiles((str(column), profile.summary()) for column, profile in columns.items())
+    }
+
+def profile_dataframe(df, chunk_rows=PROFILE_CHUNK_ROWS):
+    starts = range(0, len(df), chunk_rows) or [0]  # An empty DataFrame still reports its columns
+    return profile_chunks(df.iloc[start:start + chunk_rows] for start in starts)
+
+def profile_csv(file_path, chunk_rows=PROFILE_CHUNK_ROWS, **read_csv_options):
+    # Profiles a file without holding it in memory
+    return profile_chunks(pd.read_csv(file_path, chunksize=chunk_rows, **read_csv_options))
+
+# Example usage
+if __name__ == "__main__":
+    import json
+    print(json.dumps(profile_csv("sample_data.csv"), indent=2))
@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import file_ops
+from config import (
+    DOWNLOAD_POOL_SIZE, DOWNLOAD_WORKERS, DOWNLOAD_MAX_BYTES, DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT, IMAGE_STORE_DIR
+)
+
+# Streaming downloads over one shared keep-alive session. Bodies go to a temp file in
+# chunks and are only decoded and re-encoded when the target format differs. The
+# session's transport can be replaced (configure_downloads), so the replay harness
+# records and replays downloads along with the API traffic.
+
+# Leading bytes of the image formats we commonly receive
+MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"RIFF", "WEBP")
+]
+
+EXTENSION_FORMATS = {
+    ".png": "PNG",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".gif": "GIF",
+    ".webp": "WEBP"
+}
+
+_session = None
+_session_lock = threading.Lock()
+_transport = None
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = httpx.Client(
+                transport=_transport or httpx.HTTPTransport(limits=httpx.Limits(
+                    max_connections=DOWNLOAD_POOL_SIZE,
+                    max_keepalive_connections=DOWNLOAD_POOL_SIZE
+                )),
+                timeout=httpx.Timeout(DOWNLOAD_READ_TIMEOUT, connect=DOWNLOAD_CONNECT_TIMEOUT),
+                follow_redirects=True
+            )
+        return _session
+
+def configure_downloads(transport=None):
+    # Use transport for later downloads, e.g. to record them or replay them offline
+    global _session, _transport
+    with _session_lock:
+        _transport = transport
+        _session = None
+
+def sniff_format(path):
+    with open(path, 'rb') as file:
+        head = file.read(12)
+    for magic, image_format in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            if image_format == "WEBP" and head[8:12] != b"WEBP":
+                continue
+            return image_format
+    return None
+
+def stream_to_file(url, tmp_path, max_bytes=DOWNLOAD_MAX_BYTES):
+    with get_session().stream("GET", url) as response:
+        response.raise_for_status()
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > max_bytes:
+            raise ValueError(f"Download is {declared} bytes, over the {max_bytes} byte limit")
+        received = 0
+        with open(tmp_path, 'wb') as file:
+            for chunk in response.iter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                received += len(chunk)
+                if received > max_bytes:
+                    raise ValueError(f"Download exceeded the {max_bytes} byte limit")
+                file.write(chunk)
+    return received
+
+def finalize(tmp_path, file_path):
+    # Keep the bytes as they are when the format already matches the target extension
+    target_format = EXTENSION_FORMATS.get(os.path.splitext(file_path)[1].lower())
+    source_format = sniff_format(tmp_path)
+    if target_format is None or source_format == target_format:
+        os.replace(tmp_path, file_path)
+        return
+    from PIL import Image
+    with Image.open(tmp_path) as img:
+        if target_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(file_path, format=target_format)
+    os.unlink(tmp_path)
+
+def in_image_store(path):
+    # Only stored images are copied locally; any other local path is not a download source
+    store = os.path.realpath(IMAGE_STORE_DIR)
+    return os.path.commonpath([store, os.path.realpath(path)]) == store
+
+def copy_from_store(path, tmp_path, max_bytes=DOWNLOAD_MAX_BYTES):
+    size = os.path.getsize(path)
+    if size > max_bytes:
+        raise ValueError(f"File is {size} bytes, over the {max_bytes} byte limit")
+    shutil.copyfile(path, tmp_path)
+    return size
+
+def download_file(url, file_path, max_bytes=DOWNLOAD_MAX_BYTES):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".download")
+    os.close(fd)
+    try:
+        if os.path.exists(url) and in_image_store(url):
+            copy_from_store(url, tmp_path, max_bytes)
+        else:
+            stream_to_file(url, tmp_path, max_bytes)
+        os.chmod(tmp_path, file_ops.new_file_mode())  # mkstemp files start out as 0600
+        finalize(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return file_path
+
+def download_many(items, max_workers=DOWNLOAD_WORKERS):
+    # items are (url, file_path) pairs; returns (file_path, error or None) in the same order
+    def download(item):
+        url, file_path = item
+        try:
+            download_file(url, file_path)
+            return file_path, None
+        except Exception as e:
+            return file_path, str(e)
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        return list(executor.map(download, items))
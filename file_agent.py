@@ -1,162 +1,453 @@
 import os
-from openai import OpenAI
-import time
+from openai_client import get_client
 import json
-import requests
-from PIL import Image
-from io import BytesIO
-from config import OPENAI_API_KEY
+import file_ops
+from downloads import download_file, download_many
+from artifact_store import FETCH_ARTIFACT_TOOL, fetch_handler, get as get_artifact
+from config import FILE_READ_MAX_BYTES
+from assistant_registry import get_assistant_id
+from run_driver import run_with_tools, add_user_message, agent_engine, run_chat
+from model_router import route
+from token_budget import count_tokens
 
 def read_file(file_path):
     try:
+        size = os.path.getsize(file_path)
+        if size > FILE_READ_MAX_BYTES:
+            # Large files are only partially returned; the rest is available through ranged reads
+            content = file_ops.read_byte_range(file_path, 0, FILE_READ_MAX_BYTES)
+            return f"{content}\n... [file is {size} bytes; showing the first {FILE_READ_MAX_BYTES}. Use read_file_range, tail_file or grep_file for the rest]"
         with open(file_path, 'r') as file:
             return file.read()
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
+def read_file_range(file_path, start_line=None, end_line=None, start_byte=None, end_byte=None):
+    try:
+        if start_byte is not None or end_byte is not None:
+            return file_ops.read_byte_range(file_path, start_byte or 0, end_byte)
+        return file_ops.read_line_range(file_path, start_line or 1, end_line)
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
+
+def head_file(file_path, lines=20):
+    try:
+        return file_ops.head(file_path, lines)
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
+
+def tail_file(file_path, lines=20):
+    try:
+        return file_ops.tail(file_path, lines)
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
+
+def grep_file(file_path, pattern, max_matches=50, ignore_case=False):
+    try:
+        matches = file_ops.grep(file_path, pattern, max_matches, ignore_case)
+        if not matches:
+            return f"No lines in {file_path} match {pattern}"
+        return "\n".join(f"{line_number}: {line}" for line_number, line in matches)
+    except Exception as e:
+        return f"Error searching file: {str(e)}"
+
 def write_file(file_path, content):
     try:
-        with open(file_path, 'w') as file:
-            file.write(content)  # Fixed the method call
+        file_ops.atomic_write(file_path, content)
         return f"File successfully written to {file_path}"  # Fixed the f-string
     except Exception as e:
         return f"Error writing file: {str(e)}"
 
+def write_artifact(artifact, file_path):
+    # Saves an earlier step's output without passing its content back through the model
+    try:
+        file_ops.atomic_write(file_path, get_artifact(artifact))
+        return f"Artifact {artifact} successfully written to {file_path}"
+    except Exception as e:
+        return f"Error writing artifact: {str(e)}"
+
+def append_file(file_path, content):
+    try:
+        file_ops.append(file_path, content)
+        return f"Content successfully appended to {file_path}"
+    except Exception as e:
+        return f"Error appending to file: {str(e)}"
+
+def patch_file(file_path, anchor, content, position="replace"):
+    try:
+        file_ops.patch(file_path, anchor, content, position)
+        return f"File {file_path} successfully patched"
+    except Exception as e:
+        return f"Error patching file: {str(e)}"
+
 def download_image(url, file_path):
     try:
-        response = requests.get(url)  # Fixed variable name
-        img = Image.open(BytesIO(response.content))
-        img.save(file_path)
+        download_file(url, file_path)
         return f"Image successfully downloaded and saved to {file_path}"  # Fixed the f-string
     except Exception as e:
         return f"Error downloading image: {str(e)}"
 
-def run_assistant(prompt):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    # Create an assistant with file read/write capabilities
-    assistant = client.beta.assistants.create(
-        instructions=(
-            "You are a file management assistant. Use the provided functions to read and write files in the current working directory, and download images."
-        ),
-        model="gpt-4o-mini",  # Fixed model name
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "read_file",
-                    "description": "Read the contents of a file",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "The path to the file to be read"
-                            }
-                        },
-                        "required": ["file_path"]
+def download_images(images):
+    results = download_many([(image["url"], image["file_path"]) for image in images])
+    return "\n".join(
+        f"Error downloading image to {file_path}: {error}" if error else f"Image successfully downloaded and saved to {file_path}"
+        for file_path, error in results
+    )
+
+# Tool handlers take the parsed tool call arguments and return the tool output
+TOOL_HANDLERS = {
+    "read_file": lambda arguments: read_file(arguments["file_path"]),
+    "read_file_range": lambda arguments: read_file_range(
+        arguments["file_path"],
+        arguments.get("start_line"),
+        arguments.get("end_line"),
+        arguments.get("start_byte"),
+        arguments.get("end_byte")
+    ),
+    "head_file": lambda arguments: head_file(arguments["file_path"], arguments.get("lines", 20)),
+    "tail_file": lambda arguments: tail_file(arguments["file_path"], arguments.get("lines", 20)),
+    "grep_file": lambda arguments: grep_file(
+        arguments["file_path"],
+        arguments["pattern"],
+        arguments.get("max_matches", 50),
+        arguments.get("ignore_case", False)
+    ),
+    "write_file": lambda arguments: write_file(arguments["file_path"], arguments["content"]),
+    "append_file": lambda arguments: append_file(arguments["file_path"], arguments["content"]),
+    "patch_file": lambda arguments: patch_file(
+        arguments["file_path"],
+        arguments["anchor"],
+        arguments["content"],
+        arguments.get("position", "replace")
+    ),
+    "download_image": lambda arguments: download_image(arguments["url"], arguments["file_path"]),
+    "download_images": lambda arguments: download_images(arguments["images"]),
+    "write_artifact": lambda arguments: write_artifact(arguments["artifact"], arguments["file_path"]),
+    "fetch_artifact": fetch_handler
+}
+
+INSTRUCTIONS = (
+    "You are a file management assistant. Use the provided functions to read and write files in the current working directory, and download images. "
+    "Read only the part of a file you need (ranges, head, tail or grep), and prefer append or patch over rewriting a whole file. "
+    "Earlier step outputs may be given as artifact handles; save them with write_artifact rather than copying their content."
+)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "Read the contents of a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file to be read"
                     }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "write_file",
-                    "description": "Write content to a file",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "The path to the file to be written"
-                            },
-                            "content": {
-                                "type": "string",
-                                "description": "The content to write to the file"
-                            }
-                        },
-                        "required": ["file_path", "content"]
+                },
+                "required": ["file_path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file_range",
+            "description": "Read a range of lines (1-based, inclusive) or bytes from a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "First line to read"
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "Last line to read"
+                    },
+                    "start_byte": {
+                        "type": "integer",
+                        "description": "First byte to read (use instead of lines)"
+                    },
+                    "end_byte": {
+                        "type": "integer",
+                        "description": "Byte offset to stop reading at"
+                    }
+                },
+                "required": [
+                    "file_path"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "head_file",
+            "description": "Read the first lines of a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    },
+                    "lines": {
+                        "type": "integer",
+                        "description": "Number of lines to read"
+                    }
+                },
+                "required": [
+                    "file_path"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "tail_file",
+            "description": "Read the last lines of a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    },
+                    "lines": {
+                        "type": "integer",
+                        "description": "Number of lines to read"
+                    }
+                },
+                "required": [
+                    "file_path"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "grep_file",
+            "description": "Find the lines of a file that match a regular expression",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    },
+                    "pattern": {
+                        "type": "string",
+                        "description": "The regular expression to search for"
+                    },
+                    "max_matches": {
+                        "type": "integer",
+                        "description": "Maximum number of matching lines to return"
+                    },
+                    "ignore_case": {
+                        "type": "boolean",
+                        "description": "Whether matching ignores case"
+                    }
+                },
+                "required": [
+                    "file_path",
+                    "pattern"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "write_file",
+            "description": "Write content to a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file to be written"
+                    },
+                    "content": {
+                        "type": "string",
+                        "description": "The content to write to the file"
+                    }
+                },
+                "required": ["file_path", "content"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "append_file",
+            "description": "Append content to the end of a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    },
+                    "content": {
+                        "type": "string",
+                        "description": "The content to append"
+                    }
+                },
+                "required": [
+                    "file_path",
+                    "content"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "patch_file",
+            "description": "Edit a file in place by replacing a unique anchor string, or inserting content before or after it",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    },
+                    "anchor": {
+                        "type": "string",
+                        "description": "Text that occurs exactly once in the file"
+                    },
+                    "content": {
+                        "type": "string",
+                        "description": "The new content"
+                    },
+                    "position": {
+                        "type": "string",
+                        "enum": [
+                            "replace",
+                            "before",
+                            "after"
+                        ],
+                        "description": "Whether to replace the anchor or insert before or after it"
+                    }
+                },
+                "required": [
+                    "file_path",
+                    "anchor",
+                    "content"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "download_image",
+            "description": "Download an image from a URL and save it to a file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "url": {
+                        "type": "string",
+                        "description": "The URL of the image to download"
+                    },
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path where the image should be saved"
                     }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "download_image",
-                    "description": "Download an image from a URL and save it to a file",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "url": {
-                                "type": "string",
-                                "description": "The URL of the image to download"
+                },
+                "required": ["url", "file_path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "download_images",
+            "description": "Download several images in parallel, each saved to its own file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "images": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "url": {
+                                    "type": "string",
+                                    "description": "The URL of the image to download"
+                                },
+                                "file_path": {
+                                    "type": "string",
+                                    "description": "The path where the image should be saved"
+                                }
                             },
-                            "file_path": {
-                                "type": "string",
-                                "description": "The path where the image should be saved"
-                            }
-                        },
-                        "required": ["url", "file_path"]
+                            "required": ["url", "file_path"]
+                        }
                     }
-                }
+                },
+                "required": ["images"]
             }
-        ]
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "write_artifact",
+            "description": "Write the full content of an earlier step's output to a file, given its artifact handle",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "artifact": {
+                        "type": "string",
+                        "description": "The artifact handle from the context"
+                    },
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path to the file"
+                    }
+                },
+                "required": ["artifact", "file_path"]
+            }
+        }
+    },
+    FETCH_ARTIFACT_TOOL
+]
+
+# Capability this agent needs from the model router
+CAPABILITY = "tools"
+
+def run_assistant(prompt):
+    client = get_client()
+    models = route(CAPABILITY, count_tokens(prompt))
+
+    # Short tool loops skip the assistant, thread and run round trips
+    if agent_engine("file", TOOLS) == "chat":
+        return run_chat(client, models, INSTRUCTIONS, TOOLS, prompt, TOOL_HANDLERS)
+
+    # Get (or create once) an assistant with file read/write capabilities
+    assistant_id = get_assistant_id(
+        client,
+        instructions=INSTRUCTIONS,
+        model=models[0],
+        tools=TOOLS
     )
 
     # Create a Thread
     thread = client.beta.threads.create()  # Fixed parentheses
 
     # Add the user's prompt to the Thread
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=prompt
-    )
-
-    # Create a Run
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant.id
-    )
+    add_user_message(client, thread.id, prompt)
 
-    # Wait for the run to complete or require action
-    while True:
-        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run_status.status in ['completed', 'failed', 'requires_action']:
-            break
-        time.sleep(1)
-
-    # If the run requires action, handle it
-    if run_status.status == 'requires_action':
-        tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
-        tool_outputs = []
-        for tool_call in tool_calls:
-            if tool_call.function.name in ["read_file", "write_file", "download_image"]:
-                arguments = json.loads(tool_call.function.arguments)
-                if tool_call.function.name == "read_file":
-                    output = read_file(arguments["file_path"])
-                elif tool_call.function.name == "write_file":
-                    output = write_file(arguments["file_path"], arguments["content"])
-                else:  # download_image
-                    output = download_image(arguments["url"], arguments["file_path"])
-                tool_outputs.append({
-                    "tool_call_id": tool_call.id,
-                    "output": output
-                })
-
-        # Submit the tool outputs
-        client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread.id,
-            run_id=run.id,
-            tool_outputs=tool_outputs
-        )
-
-    # Wait for the run to complete after submitting tool outputs
-    while True:
-        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run_status.status == 'completed':
-            break
-        time.sleep(1)
+    # Create a Run and answer its tool calls; raises unless it completes
+    run_with_tools(client, thread.id, assistant_id, TOOL_HANDLERS)
 
     # Retrieve and return the assistant's response
     messages = client.beta.threads.messages.list(thread_id=thread.id)
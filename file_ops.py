@@ -0,0 +1,124 @@
+import os
+import re
+import mmap
+import tempfile
+from contextlib import contextmanager
+
+# Ranged reads and in-place edits, so the file agent can move slices of large files
+# instead of whole files. Reads of non-empty files go through mmap.
+
+# Read once at import: os.umask can only be read by setting it
+_umask = os.umask(0)
+os.umask(_umask)
+
+def new_file_mode():
+    # The mode open() would give a new file; mkstemp files start out as 0600
+    return 0o666 & ~_umask
+
+@contextmanager
+def mapped(file_path):
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+def decode(data):
+    return data.decode('utf-8', errors='replace')
+
+def line_offset(data, line_number):
+    # Byte offset where 1-based line_number starts (len(data) if past the end)
+    offset = 0
+    for _ in range(line_number - 1):
+        offset = data.find(b"\n", offset)
+        if offset == -1:
+            return len(data)
+        offset += 1
+    return offset
+
+def read_byte_range(file_path, start_byte=0, end_byte=None):
+    with mapped(file_path) as data:
+        return decode(data[start_byte:end_byte])
+
+def read_line_range(file_path, start_line=1, end_line=None):
+    # Lines are 1-based and inclusive
+    with mapped(file_path) as data:
+        start = line_offset(data, max(1, start_line))
+        end = len(data) if end_line is None else line_offset(data, end_line + 1)
+        return decode(data[start:end])
+
+def head(file_path, lines=20):
+    return read_line_range(file_path, 1, lines)
+
+def tail(file_path, lines=20):
+    # Walk backwards from the end so only the last lines are touched
+    with mapped(file_path) as data:
+        end = len(data)
+        offset = end - 1 if end and data[end - 1:end] == b"\n" else end
+        for _ in range(lines):
+            offset = data.rfind(b"\n", 0, offset)
+            if offset == -1:
+                break
+        start = 0 if offset == -1 else offset + 1
+        return decode(data[start:end])
+
+def grep(file_path, pattern, max_matches=50, ignore_case=False):
+    # Returns (line_number, line) pairs for lines matching a regular expression
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    regex = re.compile(pattern.encode("utf-8"), flags)
+    matches = []
+    counted_to, line_number = 0, 1  # Newlines are counted incrementally between matches
+    with mapped(file_path) as data:
+        for match in regex.finditer(data):
+            line_start = data.rfind(b"\n", 0, match.start()) + 1
+            if matches and matches[-1][2] == line_start:
+                continue  # Several matches on one line
+            line_end = data.find(b"\n", match.end())
+            line_end = len(data) if line_end == -1 else line_end
+            line_number += data[counted_to:line_start].count(b"\n")
+            counted_to = line_start
+            matches.append((line_number, decode(data[line_start:line_end]), line_start))
+            if len(matches) >= max_matches:
+                break
+    return [(line_number, line) for line_number, line, _ in matches]
+
+def atomic_write(file_path, content):
+    # Write to a temp file next to the target and rename, so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        if os.path.exists(file_path):
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o777)
+        else:
+            os.chmod(tmp_path, new_file_mode())
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def append(file_path, content):
+    with open(file_path, 'a') as file:
+        file.write(content)
+
+def patch(file_path, anchor, content, position="replace"):
+    # Insert content before/after the anchor, or replace it. The anchor must occur exactly once.
+    with open(file_path, 'r') as file:
+        text = file.read()
+    count = text.count(anchor)
+    if count == 0:
+        raise ValueError("Anchor not found")
+    if count > 1:
+        raise ValueError(f"Anchor occurs {count} times; use a longer, unique anchor")
+    if position == "before":
+        replacement = content + anchor
+    elif position == "after":
+        replacement = anchor + content
+    elif position == "replace":
+        replacement = content
+    else:
+        raise ValueError(f"Unknown position: {position}")
+    atomic_write(file_path, text.replace(anchor, replacement, 1))
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import httpx
+import replicate
+from rate_limiter import RateLimitedTransport
+from downloads import download_file
+from config import (
+    REPLICATE_API_TOKEN, IMAGE_MODEL, IMAGE_MAX_CONCURRENT, IMAGE_STORE_DIR, IMAGE_URL_TTL_SECONDS,
+    IMAGE_POLL_INITIAL_INTERVAL, IMAGE_POLL_MAX_INTERVAL, IMAGE_POLL_MAX_FAILURES, IMAGE_PREDICTION_TIMEOUT_SECONDS
+)
+
+# Image generation backend: one shared Replicate client, up to IMAGE_MAX_CONCURRENT
+# predictions in flight, polled together from a single thread, and a content-addressed
+# store so identical prompt and parameter requests are only generated once.
+
+DEFAULT_INPUT = {
+    "go_fast": True,
+    "guidance": 3.5,
+    "num_outputs": 1,
+    "aspect_ratio": "1:1",
+    "output_format": "png",
+    "output_quality": 80,
+    "prompt_strength": 0.8,
+    "num_inference_steps": 28
+}
+
+FINISHED_STATUSES = ['succeeded', 'failed', 'canceled']
+
+# Extra replicate.Client arguments, e.g. a base_url or transport for recording and replay
+replicate_client_options = {}
+
+def request_key(model, model_input):
+    return hashlib.sha256(json.dumps({"model": model, "input": model_input}, sort_keys=True).encode()).hexdigest()
+
+def store_paths(key):
+    return os.path.join(IMAGE_STORE_DIR, key + ".json"), os.path.join(IMAGE_STORE_DIR, key + ".png")
+
+def lookup_store(key):
+    # Replicate delivery URLs expire, so older entries are served from the stored copy
+    meta_path, image_path = store_paths(key)
+    try:
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if time.time() - meta["created_at"] < IMAGE_URL_TTL_SECONDS:
+        return meta["url"]
+    if os.path.exists(image_path):
+        return os.path.abspath(image_path)
+    return None
+
+def save_to_store(key, url, model_input):
+    os.makedirs(IMAGE_STORE_DIR, exist_ok=True)
+    meta_path, image_path = store_paths(key)
+    try:
+        download_file(url, image_path)
+    except Exception:
+        pass  # The URL is still usable until it expires
+    with open(meta_path, 'w') as file:
+        json.dump({"url": url, "created_at": time.time(), "input": model_input}, file, indent=2)
+
+class ImageBackend:
+    def __init__(self, model=IMAGE_MODEL, max_concurrent=IMAGE_MAX_CONCURRENT):
+        self.model = model
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.in_flight = {}  # request key -> Future shared by identical requests
+        self.pending = {}  # prediction id -> (prediction, key, model_input, deadline)
+        self.failures = {}  # prediction id -> consecutive reload failures
+        self.poller = None
+        self.store_writer = ThreadPoolExecutor(max_workers=2)
+        self._client = None
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                if not REPLICATE_API_TOKEN:
+                    raise ValueError("REPLICATE_API_TOKEN not found in environment variables")
+                options = dict(replicate_client_options)
+                # replicate wraps a transport= argument in its own RetryTransport (up to 10 attempts),
+                # which would multiply our retries. A catch-all mount takes precedence over that
+                # transport in httpx, so requests only go through the rate-limited one.
+                transport = RateLimitedTransport(options.pop("transport", None) or httpx.HTTPTransport())
+                options["mounts"] = {"all://": transport}
+                self._client = replicate.Client(api_token=REPLICATE_API_TOKEN, **options)
+            return self._client
+
+    def submit(self, prompt, **params):
+        # Returns a Future for the image URL (or stored file path)
+        model_input = {**DEFAULT_INPUT, **params, "prompt": prompt}
+        key = request_key(self.model, model_input)
+        stored = lookup_store(key)
+        if stored is not None:
+            future = Future()
+            future.set_result(stored)
+            return future
+
+        with self.lock:
+            if key in self.in_flight:
+                return self.in_flight[key]
+            future = Future()
+            self.in_flight[key] = future
+
+        self.slots.acquire()
+        try:
+            prediction = self.client.models.predictions.create(model=self.model, input=model_input)
+        except Exception as e:
+            self.slots.release()
+            self.finish(key, error=e)
+            return future
+        with self.lock:
+            self.pending[prediction.id] = (prediction, key, model_input, time.monotonic() + IMAGE_PREDICTION_TIMEOUT_SECONDS)
+            if self.poller is None or not self.poller.is_alive():
+                self.poller = threading.Thread(target=self.poll, daemon=True)
+                self.poller.start()
+        return future
+
+    def generate(self, prompt, **params):
+        return self.submit(prompt, **params).result()
+
+    def generate_many(self, prompts, **params):
+        futures = [self.submit(prompt, **params) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def finish(self, key, url=None, error=None, model_input=None):
+        with self.lock:
+            future = self.in_flight.pop(key, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(url)
+            self.store_writer.submit(save_to_store, key, url, model_input)
+
+    def abandon(self, prediction_id, key, error):
+        with self.lock:
+            del self.pending[prediction_id]
+        self.failures.pop(prediction_id, None)
+        self.slots.release()
+        self.finish(key, error=error)
+
+    def poll(self):
+        # One thread reloads every pending prediction per pass, backing off while nothing finishes
+        interval = IMAGE_POLL_INITIAL_INTERVAL
+        while True:
+            with self.lock:
+                pending = list(self.pending.items())
+                if not pending:
+                    self.poller = None
+                    return
+            progressed = False
+            for prediction_id, (prediction, key, model_input, deadline) in pending:
+                try:
+                    prediction.reload()
+                    self.failures.pop(prediction_id, None)
+                except Exception as e:
+                    # Transient errors are retried on the next pass; persistent ones (401, 404,
+                    # deleted prediction) give up so the slot is released and the caller unblocks
+                    self.failures[prediction_id] = self.failures.get(prediction_id, 0) + 1
+                    if self.failures[prediction_id] >= IMAGE_POLL_MAX_FAILURES:
+                        self.abandon(prediction_id, key, ValueError(f"Could not check prediction {prediction_id}: {str(e)}"))
+                        progressed = True
+                    continue
+                if prediction.status not in FINISHED_STATUSES:
+                    if time.monotonic() >= deadline:
+                        try:
+                            prediction.cancel()
+                        except Exception:
+                            pass
+                        self.abandon(prediction_id, key, TimeoutError(f"Prediction {prediction_id} did not finish in {IMAGE_PREDICTION_TIMEOUT_SECONDS} seconds"))
+                        progressed = True
+                    continue
+                progressed = True
+                with self.lock:
+                    del self.pending[prediction_id]
+                self.slots.release()
+                output = prediction.output
+                if prediction.status == 'succeeded' and output:
+                    url = output[0] if isinstance(output, list) else output
+                    self.finish(key, url=str(url), model_input=model_input)
+                else:
+                    self.finish(key, error=ValueError(f"No image URL was generated: {prediction.error or prediction.status}"))
+            interval = IMAGE_POLL_INITIAL_INTERVAL if progressed else min(interval * 1.5, IMAGE_POLL_MAX_INTERVAL)
+            time.sleep(interval)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = ImageBackend()
+        return _backend
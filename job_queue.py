@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from config import JOB_DB_PATH, JOB_WORKERS, JOB_POLL_INTERVAL, JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS
+
+# SQLite-backed job queue and worker service around the master agent. Jobs are
+# submitted and polled through the functions below (or the command line), and a
+# JobService runs JOB_WORKERS tasks concurrently in one process.
+#   python job_queue.py submit "task" ["task" ...]   # or --samples for input_file.sample_tasks
+#   python job_queue.py serve --workers 8
+#   python job_queue.py status [job_id]
+#   python job_queue.py wait job_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    trace_id TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+FINISHED_STATUSES = ["succeeded", "failed"]
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+@contextmanager
+def connection(path=JOB_DB_PATH):
+    # One short-lived connection per call, so every thread and process gets its own
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        with _init_lock:
+            if path not in _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                _initialized.add(path)
+        yield conn
+    finally:
+        conn.close()
+
+def to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    if job["result"] is not None:
+        job["result"] = json.loads(job["result"])
+    return job
+
+def submit(task, path=JOB_DB_PATH):
+    return submit_many([task], path)[0]
+
+def submit_many(tasks, path=JOB_DB_PATH):
+    job_ids = [uuid.uuid4().hex for _ in tasks]
+    now = time.time()
+    with connection(path) as conn:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO jobs (id, task, status, created_at) VALUES (?, ?, 'queued', ?)",
+            [(job_id, task, now) for job_id, task in zip(job_ids, tasks)]
+        )
+        conn.execute("COMMIT")
+    return job_ids
+
+def get_job(job_id, path=JOB_DB_PATH):
+    with connection(path) as conn:
+        return to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+def list_jobs(status=None, limit=100, path=JOB_DB_PATH):
+    with connection(path) as conn:
+        if status is None:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        else:
+            rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit))
+        return [to_job(row) for row in rows.fetchall()]
+
+def job_counts(path=JOB_DB_PATH):
+    with connection(path) as conn:
+        return {row["status"]: row["count"] for row in conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")}
+
+def wait_for_job(job_id, timeout=None, poll_interval=JOB_POLL_INTERVAL, path=JOB_DB_PATH):
+    # Poll until the job has finished; returns the job, or None on timeout
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get_job(job_id, path)
+        if job is None:
+            raise ValueError(f"Unknown job: {job_id}")
+        if job["status"] in FINISHED_STATUSES:
+            return job
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+def claim_job(worker, path=JOB_DB_PATH):
+    # BEGIN IMMEDIATE takes the write lock first, so two workers never claim the same job
+    with connection(path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT id, task FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+            (worker, time.time(), row["id"])
+        )
+        conn.execute("COMMIT")
+        return dict(row)
+
+def finish_job(job_id, result=None, error=None, trace_id=None, path=JOB_DB_PATH):
+    with connection(path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, trace_id = ?, finished_at = ? WHERE id = ?",
+            (
+                "failed" if error is not None else "succeeded",
+                None if result is None else json.dumps(result, default=str),
+                error,
+                trace_id,
+                time.time(),
+                job_id
+            )
+        )
+
+def requeue_stale(stale_seconds=JOB_STALE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS, path=JOB_DB_PATH):
+    # Jobs left running by a worker that died go back to the queue, up to max_attempts
+    cutoff = time.time() - stale_seconds
+    with connection(path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker stopped before the job finished', finished_at = ? "
+            "WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+            (time.time(), cutoff, max_attempts)
+        )
+        requeued = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL WHERE status = 'running' AND started_at < ?",
+            (cutoff,)
+        ).rowcount
+        conn.execute("COMMIT")
+    return requeued
+
+def run_job(job):
+    # Imported here: master_agent creates the API client at import time
+    from master_agent import execute_task
+    from tracing import span, export_spans
+    with span("job", job_id=job["id"], task=job["task"].strip()[:200]) as job_span:
+        results = execute_task(job["task"])
+    if job_span.trace_id is not None:
+        export_spans(job_span.trace_id)
+    return results, job_span.trace_id
+
+class JobService:
+    def __init__(self, workers=JOB_WORKERS, path=JOB_DB_PATH, poll_interval=JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.path = path
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.threads = []
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        requeue_stale(path=self.path)
+        for index in range(max(1, self.workers)):
+            thread = threading.Thread(target=self.work, args=(f"{self.name}:{index}",), name=f"job-worker-{index}")
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def work(self, worker):
+        while not self.stopping.is_set():
+            job = claim_job(worker, self.path)
+            if job is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+            trace_id = None
+            try:
+                results, trace_id = run_job(job)
+                if results is None:
+                    finish_job(job["id"], error="Planning or validation failed; see the job trace", trace_id=trace_id, path=self.path)
+                else:
+                    finish_job(job["id"], result=results, trace_id=trace_id, path=self.path)
+            except Exception as e:
+                finish_job(job["id"], error=f"{type(e).__name__}: {str(e)}", trace_id=trace_id, path=self.path)
+
+    def stop(self):
+        # Workers finish their current job before exiting
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while not self.stopping.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue master_agent tasks and run them with a pool of workers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    submit_parser = subparsers.add_parser("submit", help="Queue tasks and print their job ids")
+    submit_parser.add_argument("tasks", nargs="*")
+    submit_parser.add_argument("--samples", action="store_true", help="Queue the sample tasks from input_file.py")
+    serve_parser = subparsers.add_parser("serve", help="Run workers until interrupted")
+    serve_parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    status_parser = subparsers.add_parser("status", help="Show one job, or the queue counts and recent jobs")
+    status_parser.add_argument("job_id", nargs="?")
+    wait_parser = subparsers.add_parser("wait", help="Wait for a job to finish and print it")
+    wait_parser.add_argument("job_id")
+    wait_parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        tasks = list(args.tasks)
+        if args.samples:
+            from input_file import sample_tasks
+            tasks.extend(sample_tasks)
+        if not tasks:
+            parser.error("submit needs at least one task or --samples")
+        for job_id in submit_many(tasks):
+            print(job_id)
+    elif args.command == "serve":
+        JobService(workers=args.workers).serve_forever()
+    elif args.command == "status" and args.job_id:
+        print(json.dumps(get_job(args.job_id), indent=2))
+    elif args.command == "status":
+        print(json.dumps(job_counts(), indent=2))
+        for job in list_jobs(limit=20):
+            print(f"{job['id']}  {job['status']:<9}  {job['task'].strip()[:80]}")
+    else:
+        print(json.dumps(wait_for_job(args.job_id, timeout=args.timeout), indent=2))
+
+if __name__ == "__main__":
+    main()
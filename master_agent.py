@@ -1,8 +1,11 @@
 import os
 import re
 import json
+import time
+import threading
+from contextlib import nullcontext
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai_client import get_client
 from rich.console import Console
 from rich.panel import Panel
 from rich.syntax import Syntax
@@ -14,7 +17,16 @@ from data_loader_agent import run_data_loader
 from query_builder_agent import run_assistant as run_query_builder
 from data_analyst_validator_agent import run_assistant as run_validator
 from data_analyst_reporter_agent import run_assistant as run_reporter
-from config import OPENAI_API_KEY
+from plan_executor import execute_plan, normalize_plan, PlanAborted, PlanError
+from plan_stream import PlanStream
+from plan_cache import get_cached_plan, cache_plan, forget_cached_plan
+from tracing import span, current_span, summary_table, export_spans, usage_attributes
+from config import PLAN_STREAMING
+from token_budget import TaskBudget, count_tokens
+from model_router import route, call_with_fallback, record as record_model_call
+from run_driver import RunFailedError
+from context_serializer import serialize_context, fit_context
+from artifact_store import store_updates
 
 load_dotenv(override=True)
 
@@ -30,14 +42,95 @@ custom_theme = Theme({
 })
 console = Console(theme=custom_theme)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Shared OpenAI client (pooled keep-alive connections)
+client = get_client()
 
-def master_agent(user_task):
-    console.print(f"[info]Master Agent received the task:[/info] '{user_task}'")
+def status(message):
+    # rich allows one live display at a time, so tasks run by job workers go without a spinner
+    if threading.current_thread() is threading.main_thread():
+        return console.status(message, spinner="dots")
+    return nullcontext()
 
-    # Use the model to decide which agents to invoke and determine dependencies
-    planning_prompt = (
+def run_step(step, context, budget):
+    # Run a single plan step within its token allowance and return (results, context_updates).
+    # Large outputs reach later steps as artifact handles, so the carried context stays small.
+    with budget.step(step['id']):
+        results, updates = run_agent(step, context)
+    return results, store_updates(updates)
+
+def run_agent(step, context):
+    agent_name = step['agent']
+    agent_prompt = step['prompt']
+    results = {}
+    updates = {}
+    console.print(f"[info]Invoking {agent_name.capitalize()} Agent (step {step['id']})...[/info]")
+
+    # Include context in agent prompts, compacted to fit the step allowance
+    if context:
+        agent_prompt = f"{agent_prompt}\n\nContext from previous agents:\n{fit_context(context, agent_prompt, indent=2)}"
+
+    if agent_name.lower() == 'image':
+        image_result = run_image_agent(agent_prompt, client)  # Pass client as an argument
+        console.print(f"[success]Image Generation Agent returned:[/success]\n{image_result}")
+        results['image'] = image_result
+        updates['image'] = image_result
+
+    elif agent_name.lower() == 'code':
+        from code_agent import run_assistant as run_code_agent
+        execute_code = step['prompt'].lower().startswith('execute')
+        code_result = run_code_agent(agent_prompt, execute_code=execute_code)
+        console.print(f"[success]Code Generation Agent returned code: [/success]\n{code_result}")
+        results['code'] = code_result
+
+        # Extract code blocks (Python, HTML, etc.)
+        code_blocks = re.findall(r'```(.*?)```', code_result, re.DOTALL)
+        if code_blocks:
+            combined_code = '\n'.join(code_blocks)
+            results['code'] = combined_code
+            updates['code'] = combined_code  # Store for context
+            console.print("[success]Code extracted and stored in context.[/success]")
+        else:
+            console.print("[warning]No code blocks found in the generated result.[/warning]")
+            results['code'] = "No valid code was generated."
+            updates['code'] = results['code']
+
+    elif agent_name.lower() == 'file':
+        file_result = run_file_agent(agent_prompt)
+        console.print(f"[success]File Management Agent returned result:[/success]\n{file_result}")
+        results['file'] = file_result
+        updates['file_result'] = file_result  # Store for context
+
+    elif agent_name.lower() == 'data_loader':
+        file_paths = agent_prompt.split(",")  # Assuming file paths are comma-separated
+        updates = run_data_loader(file_paths)
+        console.print(f"[debug]Data Loader Agent returned context: {serialize_context(updates, indent=2)}")
+        console.print(f"[success]Data Loader Agent completed.[/success]")
+
+    elif agent_name.lower() == 'query_builder':
+        query_result = run_query_builder(agent_prompt, context)
+        updates['query_result'] = json.loads(query_result)
+        console.print(f"[success]Query Builder Agent completed.[/success]")
+
+    elif agent_name.lower() == 'validator':
+        # The validator serializes the context itself, and its local rules need the bare request
+        validation_result = run_validator(step['prompt'], context)
+        updates['validation_result'] = json.loads(validation_result)
+        console.print(f"[success]Data Analyst Validator Agent completed.[/success]")
+        if not updates['validation_result']['is_valid']:
+            raise PlanAborted(updates['validation_result']['message'])
+
+    elif agent_name.lower() == 'reporter':
+        report = run_reporter(context)
+        results['report'] = report
+        console.print(f"[success]Data Analyst Reporter Agent completed.[/success]")
+
+    else:
+        console.print(f"[warning]Unknown agent: {agent_name}[/warning]")
+
+    return results, updates
+
+def planning_prompt(user_task):
+    return (
         f"<task>{user_task}</task>\n\n"
         f"<instructions>"
         f"As the Master Agent, you need to create a VERY PRECISE plan to complete the task by utilizing the following agents:\n"
@@ -51,11 +144,12 @@ def master_agent(user_task):
         f"<agent name='reporter'>Data Analyst Reporter Agent: Generates comprehensive reports on data analysis results.</agent>\n"
         f"</agents>\n"
         f"Determine which agents to use and the order in which to invoke them, based on dependencies.\n"
+        f"Give every step a unique integer id and list in depends_on the ids of the earlier steps whose output it needs. Steps that do not need each other's output must not depend on each other, so they can run in parallel.\n"
         f"Specify the plan in JSON format with the following structure:\n"
         f"<json_structure>"
         f"{{\n"
         f"  \"plan\": [\n"
-        f"    {{ \"agent\": \"agent_name\", \"prompt\": \"prompt_for_agent\" }},\n"
+        f"    {{ \"id\": 1, \"agent\": \"agent_name\", \"prompt\": \"prompt_for_agent\", \"depends_on\": [] }},\n"
         f"    ... \n"
         f"  ]\n"
         f"}}"
@@ -70,19 +164,26 @@ def master_agent(user_task):
         f"</instructions>"
     )
 
+def create_plan(user_task):
+    # Use the model to decide which agents to invoke and determine dependencies
     console.print("[info]Master Agent is creating a plan to complete the task.[/info]")
 
-    with console.status("[spinner]Planning...", spinner="dots") as status:
-        response = client.chat.completions.create(
-            model="chatgpt-4o-latest",
-            messages=[
-                {
-                    "role": "user",
-                    "content": planning_prompt,
-                }
-            ]
+    prompt = planning_prompt(user_task)
+    with status("[spinner]Planning..."), span("planner") as planner_span:
+        response, model = call_with_fallback(
+            route("planning", count_tokens(prompt)),
+            lambda model: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    }
+                ]
+            )
         )
-        
+        planner_span.set(model=model, **usage_attributes(response.usage))
+
         plan_text = response.choices[0].message.content.strip()
         console.print(f"[info]Received plan: [/info]\n{plan_text}")
 
@@ -91,87 +192,127 @@ def master_agent(user_task):
         plan = json.loads(plan_text)
         if 'plan' not in plan:
             raise ValueError("Plan does not contain 'plan' key.")
+        plan['plan'] = normalize_plan(plan['plan'])
     except ValueError as e:
         console.print(f"[error]Error parsing plan: {e}[/error]")
+        return None
+
+    return plan
+
+def stream_plan(user_task, parent=None):
+    # Yields the planner's text as it is generated; runs on the plan executor's reader thread
+    prompt = planning_prompt(user_task)
+    models = route("planning", count_tokens(prompt))
+    with span("planner", parent=parent, streamed=True) as planner_span:
+        # Fall back to the next model if the stream cannot be opened. Latency is recorded
+        # for the whole stream so it is comparable with non-streamed calls.
+        for index, model in enumerate(models):
+            started = time.perf_counter()
+            try:
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt,
+                        }
+                    ],
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                break
+            except Exception:
+                record_model_call(model, time.perf_counter() - started, False)
+                if index == len(models) - 1:
+                    raise
+        planner_span.set(model=model)
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    planner_span.set(**usage_attributes(chunk.usage))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            record_model_call(model, time.perf_counter() - started, False)
+            raise
+        record_model_call(model, time.perf_counter() - started, True)
+
+def master_agent(user_task):
+    with span("task", task=user_task.strip()[:200]) as task_span:
+        final_response = run_task(user_task)
+
+    # Show where the time went and keep the trace on disk
+    if task_span.trace_id is not None:
+        console.print(summary_table(task_span.trace_id))
+        export_spans(task_span.trace_id)
+    return final_response
+
+def run_task(user_task):
+    results = execute_task(user_task)
+    if results is None:
         return
+    return format_results(results)
 
-    # Execute the plan
-    results = {}
-    context = {}
-    for step in plan['plan']:
-        agent_name = step['agent']
-        agent_prompt = step['prompt']
-        console.print(f"[info]Invoking {agent_name.capitalize()} Agent...[/info]")
-        
-        # Include context in agent prompts
-        if context:
-            agent_prompt = f"{agent_prompt}\n\nContext from previous agents:\n{json.dumps(context, indent=2)}"
-        
-        if agent_name.lower() == 'image':
-            with console.status("[spinner]Generating images...", spinner="dots") as status:
-                image_result = run_image_agent(agent_prompt, client)  # Pass client as an argument
-                console.print(f"[success]Image Generation Agent returned:[/success]\n{image_result}")
-                results['image'] = image_result
-                context['image'] = image_result
-
-        elif agent_name.lower() == 'code':
-            from code_agent import run_assistant as run_code_agent
-            execute_code = step['prompt'].lower().startswith('execute')
-            with console.status("[spinner]Generating or executing code...", spinner="dots") as status:
-                code_result = run_code_agent(agent_prompt, execute_code=execute_code)
-                console.print(f"[success]Code Generation Agent returned code: [/success]\n{code_result}")
-                results['code'] = code_result
-                
-                # Extract code blocks (Python, HTML, etc.)
-                code_blocks = re.findall(r'```(.*?)```', code_result, re.DOTALL)
-                if code_blocks:
-                    combined_code = '\n'.join(code_blocks)
-                    results['code'] = combined_code
-                    context['code'] = combined_code  # Store for context
-                    console.print("[success]Code extracted and stored in context.[/success]")
-                else:
-                    console.print("[warning]No code blocks found in the generated result.[/warning]")
-                    results['code'] = "No valid code was generated."
-                    context['code'] = results['code']
-
-        elif agent_name.lower() == 'file':
-            with console.status("[spinner]Performing file operation...", spinner="dots") as status:
-                file_result = run_file_agent(agent_prompt)
-                console.print(f"[success]File Management Agent returned result:[/success]\n{file_result}")
-                results['file'] = file_result
-                context['file_result'] = file_result  # Store for context
-
-        elif agent_name.lower() == 'data_loader':
-            with console.status("[spinner]Loading data...", spinner="dots") as status:
-                file_paths = agent_prompt.split(",")  # Assuming file paths are comma-separated
-                context = run_data_loader(file_paths)
-                console.print(f"[debug]Data Loader Agent returned context: {json.dumps(context, indent=2)}")
-                console.print(f"[success]Data Loader Agent completed.[/success]")
-
-        elif agent_name.lower() == 'query_builder':
-            with console.status("[spinner]Building and executing query...", spinner="dots") as status:
-                query_result = run_query_builder(agent_prompt, context)
-                context['query_result'] = json.loads(query_result)
-                console.print(f"[success]Query Builder Agent completed.[/success]")
-
-        elif agent_name.lower() == 'validator':
-            with console.status("[spinner]Validating results...", spinner="dots") as status:
-                validation_result = run_validator(agent_prompt, context)
-                context['validation_result'] = json.loads(validation_result)
-                console.print(f"[success]Data Analyst Validator Agent completed.[/success]")
-                if not context['validation_result']['is_valid']:
-                    console.print(f"[error]{context['validation_result']['message']}[/error]")
-                    return  # Stop execution if validation fails
-
-        elif agent_name.lower() == 'reporter':
-            with console.status("[spinner]Generating report...", spinner="dots") as status:
-                report = run_reporter(context)
-                results['report'] = report
-                console.print(f"[success]Data Analyst Reporter Agent completed.[/success]")
+def execute_task(user_task):
+    # Plan and run the task; returns the merged step results, or None if planning or validation failed
+    console.print(f"[info]Master Agent received the task:[/info] '{user_task}'")
 
-        else:
-            console.print(f"[warning]Unknown agent: {agent_name}[/warning]")
+    # Recurring tasks reuse a cached plan template instead of calling the planner
+    plan = get_cached_plan(user_task)
+    if plan is not None:
+        try:
+            plan['plan'] = normalize_plan(plan['plan'])
+        except ValueError as e:
+            # A template that no longer instantiates to a valid plan is dropped and replanned
+            console.print(f"[warning]Discarding cached plan: {e}[/warning]")
+            forget_cached_plan(user_task)
+            plan = None
+    from_cache = plan is not None
+    plan_stream = None
+    if from_cache:
+        console.print(f"[info]Reusing cached plan: [/info]\n{json.dumps(plan, indent=2)}")
+        steps = plan['plan']
+    elif PLAN_STREAMING:
+        # Steps start executing as soon as the planner has finished writing them
+        console.print("[info]Master Agent is creating a plan to complete the task.[/info]")
+        plan_stream = PlanStream(
+            stream_plan(user_task, parent=current_span()),
+            on_step=lambda step: console.print(f"[info]Planned step: [/info]{json.dumps(step)}")
+        )
+        steps = plan_stream
+    else:
+        plan = create_plan(user_task)
+        if plan is None:
+            return
+        steps = plan['plan']
+
+    # Execute the plan as a DAG; independent steps run concurrently
+    budget = TaskBudget()
+    try:
+        with status("[spinner]Executing plan..."):
+            results, context = execute_plan(steps, lambda step, context: run_step(step, context, budget))
+    except PlanError as e:  # Includes PlanStreamError
+        console.print(f"[error]Error parsing plan: {e}[/error]")
+        return
+    except PlanAborted as e:
+        console.print(f"[error]{e}[/error]")
+        return  # Stop execution if validation fails
+    except RunFailedError as e:
+        console.print(f"[error]Agent run did not complete: {e}[/error]")
+        return
+
+    if plan_stream is not None:
+        plan = plan_stream.plan()
+
+    token_usage = budget.summary()
+    console.print(f"[info]Tokens used: {token_usage['used']} of {token_usage['task_budget']}[/info]")
+
+    # Only plans that ran to completion are worth reusing
+    if not from_cache:
+        cache_plan(user_task, plan)
+    return results
 
+def format_results(results):
     # Combine and return the results
     final_response = ''
 
@@ -205,7 +346,7 @@ if __name__ == '__main__':
     
     # Load data
     context = run_data_loader(file_paths)
-    console.print(f"[info]Data loaded with context: {json.dumps(context, indent=2)}")
+    console.print(f"[info]Data loaded with context: {serialize_context(context, indent=2)}")
     
     # Continue with the rest of the task
     response = master_agent(user_task)
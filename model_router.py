@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import random
+import atexit
+import threading
+from collections import deque
+import file_ops
+from config import (
+    CAPABILITY_MODELS, MODEL_TIERS, MODEL_CONTEXT_TOKENS, ROUTER_LATENCY_CAPABILITIES, ROUTER_LARGE_PROMPT_TOKENS,
+    ROUTER_WINDOW, ROUTER_MIN_SAMPLES, ROUTER_EXPLORE_RATE, ROUTER_MAX_ERROR_RATE, ROUTER_MAX_P95_SECONDS, ROUTER_STATS_PATH, ROUTER_SAVE_INTERVAL
+)
+
+# Picks a model per call from the capability's pool. Large prompts go to the strongest
+# model, small prompts for latency-sensitive capabilities to the lowest observed p50 (with
+# occasional exploration of the others), and everything else follows the configured
+# preference. Degraded models (high error rate or p95) are only tried after the healthy ones. Latency and errors are kept in rolling
+# windows and saved to ROUTER_STATS_PATH, so they carry over between runs.
+
+_samples = {}  # model -> deque of (seconds, ok)
+_lock = threading.Lock()
+_loaded = False
+_last_saved = 0.0
+
+def load_stats(path=ROUTER_STATS_PATH):
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(path, 'r') as file:
+            saved = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return
+    for model, samples in saved.items():
+        _samples[model] = deque((tuple(sample) for sample in samples), maxlen=ROUTER_WINDOW)
+
+def save_stats(path=ROUTER_STATS_PATH):
+    global _last_saved
+    with _lock:
+        snapshot = {model: list(samples) for model, samples in _samples.items()}
+        _last_saved = time.monotonic()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_ops.atomic_write(path, json.dumps(snapshot))
+
+atexit.register(lambda: _loaded and save_stats())
+
+def record(model, seconds, ok):
+    with _lock:
+        load_stats()
+        _samples.setdefault(model, deque(maxlen=ROUTER_WINDOW)).append((round(seconds, 3), bool(ok)))
+        due = time.monotonic() - _last_saved >= ROUTER_SAVE_INTERVAL
+    if due:
+        try:
+            save_stats()
+        except OSError:
+            pass  # Stats are best effort
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def model_stats(model):
+    with _lock:
+        load_stats()
+        samples = list(_samples.get(model, ()))
+    latencies = [seconds for seconds, ok in samples if ok]
+    return {
+        "samples": len(samples),
+        "error_rate": sum(1 for _, ok in samples if not ok) / len(samples) if samples else 0.0,
+        "p50": percentile(latencies, 0.5) if latencies else None,
+        "p95": percentile(latencies, 0.95) if latencies else None
+    }
+
+def is_degraded(stats):
+    if stats["samples"] < ROUTER_MIN_SAMPLES:
+        return False
+    return stats["error_rate"] > ROUTER_MAX_ERROR_RATE or (stats["p95"] or 0) > ROUTER_MAX_P95_SECONDS
+
+def route(capability, prompt_tokens=0):
+    # Returns the capability's models in the order they should be tried
+    pool = CAPABILITY_MODELS[capability]
+    fitting = [model for model in pool if prompt_tokens <= MODEL_CONTEXT_TOKENS.get(model, float("inf"))] or list(pool)
+    stats = {model: model_stats(model) for model in fitting}
+
+    if prompt_tokens > ROUTER_LARGE_PROMPT_TOKENS:
+        ordered = sorted(fitting, key=lambda model: -MODEL_TIERS.get(model, 0))
+    elif capability in ROUTER_LATENCY_CAPABILITIES:
+        # Models with enough samples are ordered by p50; the rest keep their configured order after them
+        sampled = [model for model in fitting if stats[model]["p50"] is not None and stats[model]["samples"] >= ROUTER_MIN_SAMPLES]
+        ordered = sorted(sampled, key=lambda model: stats[model]["p50"]) + [model for model in fitting if model not in sampled]
+        if len(ordered) > 1 and random.random() < ROUTER_EXPLORE_RATE:
+            # Only the first model is normally called, so occasionally lead with another one
+            # (unsampled models first) to collect its latency
+            explore = random.choice([model for model in ordered if model not in sampled] or ordered[1:])
+            ordered = [explore] + [model for model in ordered if model != explore]
+    else:
+        ordered = fitting  # Configured preference
+
+    healthy = [model for model in ordered if not is_degraded(stats[model])]
+    return healthy + [model for model in ordered if model not in healthy]
+
+def call_with_fallback(models, call):
+    # Try call(model) on each model in turn; returns (result, model) from the first that succeeds
+    last_error = None
+    for model in models:
+        started = time.perf_counter()
+        try:
+            result = call(model)
+        except Exception as e:
+            record(model, time.perf_counter() - started, False)
+            last_error = e
+            continue
+        record(model, time.perf_counter() - started, True)
+        return result, model
+    raise last_error
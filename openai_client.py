@@ -0,0 +1,103 @@
+import re
+import threading
+import httpx
+from openai import OpenAI
+from config import (
+    OPENAI_API_KEY, OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_KEEPALIVE_EXPIRY, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT
+)
+from tracing import start_span
+from rate_limiter import RateLimitedTransport
+
+# One OpenAI client per process so every agent shares the same warm connection pool
+_client = None
+_client_lock = threading.Lock()
+
+# Set by configure_client, e.g. to record traffic or replay it from a local server
+_transport = None
+_base_url = None
+
+_stats = {"requests": 0, "connections_opened": 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def _trace(event_name, info):
+    # httpcore only connects when no idle keep-alive connection is available
+    if event_name == "connection.connect_tcp.complete":
+        _count("connections_opened")
+
+ID_PATTERN = re.compile(r"/(asst|thread|run|msg|step|call|file)_[A-Za-z0-9]+")
+
+def _on_request(request):
+    _count("requests")
+    request.extensions["trace"] = _trace
+
+class TracedTransport(httpx.BaseTransport):
+    # One span per API request, covering rate-limit waits and retries. It is ended on the
+    # response or on the error raised instead (connection errors, an open circuit).
+    def __init__(self, inner):
+        self.inner = inner
+
+    def handle_request(self, request):
+        route = ID_PATTERN.sub(lambda match: "/{" + match.group(1) + "}", request.url.path)
+        api_span = start_span(f"api {request.method} {route}")
+        try:
+            response = self.inner.handle_request(request)
+        except BaseException as e:
+            api_span.set(error=type(e).__name__)
+            api_span.end()
+            raise
+        api_span.set(status=response.status_code)
+        api_span.end()
+        return response
+
+    def close(self):
+        self.inner.close()
+
+def build_http_client(max_connections=OPENAI_MAX_CONNECTIONS,
+                      max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                      keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                      timeout=OPENAI_TIMEOUT,
+                      connect_timeout=OPENAI_CONNECT_TIMEOUT,
+                      transport=None):
+    # Every request goes through the shared rate limiter, retries and circuit breaker
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry
+    )
+    return httpx.Client(
+        transport=TracedTransport(RateLimitedTransport(transport or httpx.HTTPTransport(limits=limits))),
+        limits=limits,
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        event_hooks={"request": [_on_request]}
+    )
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=_base_url,
+                max_retries=0,  # Retries are handled by the rate limiter
+                http_client=build_http_client(transport=_transport)
+            )
+        return _client
+
+def configure_client(transport=None, base_url=None):
+    # Replace the shared client; modules that already hold the old client keep using it
+    global _client, _transport, _base_url
+    with _client_lock:
+        _transport = transport
+        _base_url = base_url
+        _client = None
+
+def connection_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["connections_reused"] = max(0, stats["requests"] - stats["connections_opened"])
+    return stats
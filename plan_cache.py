@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from config import PLAN_CACHE_DIR, PLAN_CACHE_SIZE, PLAN_CACHE_DISK_SIZE, PLAN_CACHE_TTL_SECONDS
+
+# Plans are cached per normalized task: URLs, file paths and numbers in the task become
+# parameters, so "top 5 rows of a.csv" and "top 10 rows of b.csv" share one plan template.
+# Only step prompts are templated; ids and dependencies are structure, not parameters.
+# Paths and URLs are also templated in their derived forms (file name and stem, which is
+# how the data loader names DataFrames); plans where a derived form is too short to
+# replace safely are not cached.
+LITERAL_PATTERN = re.compile(
+    r"(?P<url>https?://[^\s'\"<>]*[^\s'\"<>.,;:!?)])"
+    r"|(?P<path>(?<![\w])(?:~|\.{1,2})?/[\w.\-/]*[\w\-]|\b[\w.\-/]*[\w\-]\.(?:csv|tsv|json|html?|txt|md|png|jpe?g|gif|xlsx?|parquet|py)\b)"
+    r"|(?P<number>(?<![\w.])\d+(?:\.\d+)?(?!\w|\.\d))"
+)
+
+# Derived forms shorter than this could match ordinary words in a prompt
+MIN_DERIVED_LENGTH = 4
+# Bumped when the template format changes, so older cached templates are ignored
+TEMPLATE_VERSION = 2
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+def normalize_task(task):
+    # Returns (template, params); the template is the cache key
+    params = []
+
+    def replace(match):
+        params.append(match.group(0))
+        return f"<{match.lastgroup}>"
+
+    template = LITERAL_PATTERN.sub(replace, task)
+    template = " ".join(template.lower().split())
+    return template, params
+
+def marker(index, form=None):
+    return f"<<p{index}>>" if form is None else f"<<p{index}.{form}>>"
+
+def derived_forms(value):
+    # {"name": file name, "stem": file name without extensions} for path and URL parameters
+    match = LITERAL_PATTERN.fullmatch(value)
+    if match is None or match.lastgroup not in ("url", "path"):
+        return {}
+    name = os.path.basename(value.split("?", 1)[0].rstrip("/"))
+    forms = {"name": name, "stem": name.split(".")[0]}
+    return {form: text for form, text in forms.items() if text and text != value}
+
+def literal_regex(value):
+    return re.compile(r"(?<![\w.])" + re.escape(value) + r"(?!\w|\.\d)")
+
+def map_prompts(plan, function):
+    plan = dict(plan)
+    plan['plan'] = [
+        {**step, 'prompt': function(step['prompt'])} if isinstance(step.get('prompt'), str) else step
+        for step in plan['plan']
+    ]
+    return plan
+
+def templatize_plan(plan, params):
+    # Returns the template, or None when a parameter's derived form cannot be templated safely
+    replacements = [(value, marker(index)) for index, value in enumerate(params)]
+    short = []
+    for index, value in enumerate(params):
+        for form, text in derived_forms(value).items():
+            if len(text) >= MIN_DERIVED_LENGTH:
+                replacements.append((text, marker(index, form)))
+            else:
+                short.append(text)
+    texts = [text for text, _ in replacements]
+    if len(set(texts)) != len(texts):
+        return None  # Two parameters share a derived form
+    # Longest values first so "2.2" is replaced before "2" and a path before its file name
+    replacements.sort(key=lambda replacement: -len(replacement[0]))
+
+    def replace(text):
+        for value, value_marker in replacements:
+            text = literal_regex(value).sub(value_marker, text)
+        return text
+
+    template_plan = map_prompts(plan, replace)
+    for step in template_plan['plan']:
+        if any(literal_regex(text).search(step.get('prompt') or "") for text in short):
+            return None  # A stale short derived form would survive instantiation
+    return template_plan
+
+def instantiate_plan(template_plan, params):
+    def replace(text):
+        for index, value in enumerate(params):
+            text = text.replace(marker(index), value)
+            for form, derived in derived_forms(value).items():
+                text = text.replace(marker(index, form), derived)
+            # derived_forms leaves out forms equal to the value itself (a bare file name)
+            text = text.replace(marker(index, "name"), value).replace(marker(index, "stem"), value)
+        return text
+
+    return map_prompts(template_plan, replace)
+
+def cache_file(key):
+    return os.path.join(PLAN_CACHE_DIR, key + ".json")
+
+def read_entry(key):
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+            return entry
+    if PLAN_CACHE_DIR is None:
+        return None
+    try:
+        with open(cache_file(key), 'r') as file:
+            entry = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    remember(key, entry)
+    return entry
+
+def remember(key, entry):
+    with _lock:
+        _memory[key] = entry
+        _memory.move_to_end(key)
+        while len(_memory) > PLAN_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+def write_entry(key, entry):
+    remember(key, entry)
+    if PLAN_CACHE_DIR is None:
+        return
+    os.makedirs(PLAN_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PLAN_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, 'w') as file:
+        json.dump(entry, file, indent=2)
+    os.replace(tmp_path, cache_file(key))
+    prune_disk()
+
+def prune_disk():
+    # Keep only the most recently written PLAN_CACHE_DISK_SIZE entries on disk
+    paths = [os.path.join(PLAN_CACHE_DIR, name) for name in os.listdir(PLAN_CACHE_DIR) if name.endswith(".json")]
+    if len(paths) <= PLAN_CACHE_DISK_SIZE:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - PLAN_CACHE_DISK_SIZE]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+def task_key(template):
+    return hashlib.sha256(template.encode()).hexdigest()
+
+def get_cached_plan(task, ttl_seconds=PLAN_CACHE_TTL_SECONDS):
+    template, params = normalize_task(task)
+    key = task_key(template)
+    entry = read_entry(key)
+    if entry is None or entry.get("version") != TEMPLATE_VERSION or len(entry["params"]) != len(params):
+        return None
+    if time.time() - entry["created_at"] > ttl_seconds:
+        forget_plan(key)
+        return None
+    return instantiate_plan(entry["plan"], params)
+
+def cache_plan(task, plan):
+    template, params = normalize_task(task)
+    if len(set(params)) != len(params):
+        return False  # Repeated literals would make the template ambiguous
+    template_plan = templatize_plan(plan, params)
+    if template_plan is None:
+        return False
+    entry = {
+        "version": TEMPLATE_VERSION,
+        "template": template,
+        "params": params,
+        "plan": template_plan,
+        "created_at": time.time()
+    }
+    write_entry(task_key(template), entry)
+    return True
+
+def forget_cached_plan(task):
+    forget_plan(task_key(normalize_task(task)[0]))
+
+def forget_plan(key):
+    with _lock:
+        _memory.pop(key, None)
+    if PLAN_CACHE_DIR is not None:
+        try:
+            os.unlink(cache_file(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,176 @@
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import MAX_PLAN_WORKERS, STEP_LOG_SIZE
+from tracing import span, current_span
+
+class PlanAborted(Exception):
+    pass
+
+class PlanError(ValueError):
+    # A plan that is structurally invalid: duplicate ids, unknown dependencies or cycles
+    pass
+
+# Executed steps are recorded here with their agent and duration. Only the most recent
+# STEP_LOG_SIZE are kept, so long-running job workers do not grow it without bound.
+# step_count is the number of steps ever recorded and each entry's seq its position in it.
+step_log = deque(maxlen=STEP_LOG_SIZE)
+step_count = 0
+_step_log_lock = threading.Lock()
+
+def steps_since(seq):
+    with _step_log_lock:
+        return [entry for entry in step_log if entry["seq"] >= seq]
+
+def timed_step(run_step, step, context, parent=None):
+    global step_count
+    started = time.perf_counter()
+    status = "failed"
+    try:
+        with span(f"step.{step['agent']}", parent=parent, step_id=step['id']):
+            output = run_step(step, context)
+        status = "completed"
+        return output
+    except PlanAborted:
+        status = "aborted"
+        raise
+    finally:
+        with _step_log_lock:
+            step_log.append({
+                "seq": step_count,
+                "step_id": step['id'],
+                "agent": step['agent'],
+                "started": started,
+                "seconds": round(time.perf_counter() - started, 3),
+                "status": status
+            })
+            step_count += 1
+
+def normalize_step(step, index, previous_id=None):
+    # Give a step a string id and an explicit depends_on list.
+    # Steps without depends_on keep the old behaviour and depend on the previous step.
+    step = dict(step)
+    step['id'] = str(step.get('id', index + 1))
+    if 'depends_on' in step:
+        step['depends_on'] = [str(dep) for dep in step['depends_on'] or []]
+    else:
+        step['depends_on'] = [previous_id] if previous_id is not None else []
+    return step
+
+def normalize_plan(steps):
+    normalized = []
+    previous_id = None
+    for index, step in enumerate(steps):
+        step = normalize_step(step, index, previous_id)
+        previous_id = step['id']
+        normalized.append(step)
+
+    ids = [step['id'] for step in normalized]
+    if len(set(ids)) != len(ids):
+        raise PlanError("Plan contains duplicate step ids.")
+    for step in normalized:
+        for dep in step['depends_on']:
+            if dep not in ids:
+                raise PlanError(f"Step {step['id']} depends on unknown step {dep}.")
+            if dep == step['id']:
+                raise PlanError(f"Step {step['id']} depends on itself.")
+    topological_order(normalized)  # Raises on cycles
+    return normalized
+
+def topological_order(steps):
+    remaining = {step['id']: set(step['depends_on']) for step in steps}
+    order = []
+    while remaining:
+        ready = [step['id'] for step in steps if step['id'] in remaining and not remaining[step['id']]]
+        if not ready:
+            raise PlanError(f"Plan contains a dependency cycle between steps: {sorted(remaining)}")
+        for step_id in ready:
+            del remaining[step_id]
+            order.append(step_id)
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+def ancestors(steps_by_id, step_id):
+    seen = set()
+    stack = list(steps_by_id[step_id]['depends_on'])
+    while stack:
+        dep = stack.pop()
+        if dep not in seen:
+            seen.add(dep)
+            stack.extend(steps_by_id[dep]['depends_on'])
+    return seen
+
+def merge_outputs(steps, outputs, include=None):
+    # Merge step outputs in plan order so the result never depends on completion order
+    results = {}
+    context = {}
+    for step in steps:
+        if step['id'] not in outputs or (include is not None and step['id'] not in include):
+            continue
+        step_results, step_context = outputs[step['id']]
+        results.update(step_results or {})
+        context.update(step_context or {})
+    return results, context
+
+def execute_plan(steps, run_step, max_workers=MAX_PLAN_WORKERS):
+    # Run plan steps as a DAG. run_step(step, context) returns (results, context_updates)
+    # and only sees the context produced by the steps it (transitively) depends on.
+    # steps may also be an iterator that yields steps while the plan is still being
+    # generated; each step is scheduled as soon as it and its dependencies are known.
+    if isinstance(steps, (list, tuple)):
+        steps = normalize_plan(steps)
+    events = queue.Queue()
+
+    def produce():
+        try:
+            for step in steps:
+                events.put(("step", step))
+            events.put(("end", None))
+        except BaseException as e:
+            events.put(("error", e))
+
+    received = []
+    steps_by_id = {}
+    outputs = {}
+    pending = set()
+    running = {}
+    producing = True
+    parent = current_span()  # Steps run on worker threads, which do not inherit it
+    threading.Thread(target=produce, daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            while producing or pending or running:
+                for step in received:
+                    step_id = step['id']
+                    if step_id in pending and all(dep in outputs for dep in step['depends_on']):
+                        _, step_context = merge_outputs(received, outputs, include=ancestors(steps_by_id, step_id))
+                        future = executor.submit(timed_step, run_step, step, step_context, parent)
+                        running[future] = step_id
+                        future.add_done_callback(lambda done: events.put(("done", done)))
+                        pending.discard(step_id)
+
+                kind, value = events.get()
+                if kind == "step":
+                    step = normalize_step(value, len(received), received[-1]['id'] if received else None)
+                    if step['id'] in steps_by_id:
+                        raise PlanError(f"Plan contains duplicate step id {step['id']}.")
+                    received.append(step)
+                    steps_by_id[step['id']] = step
+                    pending.add(step['id'])
+                elif kind == "done":
+                    outputs[running.pop(value)] = value.result()
+                elif kind == "end":
+                    producing = False
+                    normalize_plan(received)  # Unknown dependencies and cycles can only be checked on the full plan
+                else:
+                    raise value
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+
+    return merge_outputs(received, outputs)
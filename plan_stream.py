@@ -0,0 +1,90 @@
+import json
+from plan_executor import normalize_plan, PlanError
+
+# Incremental parsing of a streamed {"plan": [...]} response, so each step can be
+# executed as soon as its object is complete instead of after the whole plan arrives.
+
+class PlanStreamError(PlanError):
+    pass
+
+class StepParser:
+    # Scans the text once, tracking strings and nesting, and returns every step object
+    # in the top-level "plan" array as soon as its closing brace arrives
+    def __init__(self):
+        self.text = ''
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        self.last_key = None
+        self.in_plan = False
+        self.step_start = None
+        self.seen_plan = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        steps = []
+        while self.position < len(self.text):
+            char = self.text[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1:
+                        self.last_key = json.loads(self.text[self.string_start:self.position + 1])
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.position
+            elif char in '{[':
+                if char == '[' and len(self.stack) == 1 and self.last_key == 'plan':
+                    self.in_plan = self.seen_plan = True
+                elif char == '{' and len(self.stack) == 2 and self.in_plan:
+                    self.step_start = self.position
+                self.stack.append(char)
+            elif char in '}]':
+                if not self.stack:
+                    raise PlanStreamError(f"Unbalanced '{char}' in plan")
+                self.stack.pop()
+                if char == '}' and len(self.stack) == 2 and self.step_start is not None:
+                    try:
+                        steps.append(json.loads(self.text[self.step_start:self.position + 1]))
+                    except json.JSONDecodeError as e:
+                        raise PlanStreamError(f"Invalid plan step: {e}")
+                    self.step_start = None
+                elif char == ']' and len(self.stack) == 1:
+                    self.in_plan = False
+            self.position += 1
+        return steps
+
+class PlanStream:
+    # Iterates over plan steps while the planner is still generating. chunks yields text deltas.
+    def __init__(self, chunks, on_step=None):
+        self.chunks = chunks
+        self.on_step = on_step
+        self.parser = StepParser()
+        self.steps = []
+
+    @property
+    def text(self):
+        return self.parser.text
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            for step in self.parser.feed(chunk):
+                self.steps.append(step)
+                if self.on_step is not None:
+                    self.on_step(step)
+                yield step
+        if not self.parser.seen_plan:
+            raise PlanStreamError("Plan does not contain 'plan' key.")
+        self.plan()  # Validate the complete plan
+
+    def plan(self):
+        try:
+            return {"plan": normalize_plan(self.steps)}
+        except ValueError as e:
+            raise PlanStreamError(str(e))
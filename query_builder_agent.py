@@ -1,88 +1,76 @@
 import os
-from openai import OpenAI
-import time
+from openai_client import get_client
 import json
 import pandas as pd
-from config import OPENAI_API_KEY
+from assistant_registry import get_assistant_id
+from run_driver import run_with_tools, add_user_message, agent_engine, run_chat
+from model_router import route
+from token_budget import count_tokens
+from context_serializer import fit_context
+from artifact_store import FETCH_ARTIFACT_TOOL, fetch_handler
+from query_engine import execute_query
 
-def run_assistant(prompt, context):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    assistant = client.beta.assistants.create(
-        instructions=(
-            "You are a query building assistant. Interpret user prompts for data analysis tasks "
-            "and build Python queries based on the available data."
-        ),
-        model="gpt-4o-mini",
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "execute_query",
-                    "description": "Execute a Python query on a DataFrame",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "The Python query to execute"
-                            },
-                            "df_name": {
-                                "type": "string",
-                                "description": "The name of the DataFrame to query"
-                            }
-                        },
-                        "required": ["query", "df_name"]
+INSTRUCTIONS = (
+    "You are a query building assistant. Interpret user prompts for data analysis tasks "
+    "and build queries based on the available data. Use a pandas expression on `df` (the DataFrame "
+    "named by df_name) or a SQL SELECT over the loaded DataFrames, which are registered as tables by name. "
+    "Pandas expressions can use df, the other DataFrames by name and basic builtins; pd and np are not available."
+)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "execute_query",
+            "description": "Execute a pandas expression or SQL query on the loaded DataFrames",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "A pandas expression using `df`, e.g. df.nlargest(5, 'height'), or a SQL SELECT statement"
+                    },
+                    "df_name": {
+                        "type": "string",
+                        "description": "The name of the DataFrame to query"
                     }
-                }
+                },
+                "required": ["query", "df_name"]
             }
-        ]
-    )
+        }
+    },
+    FETCH_ARTIFACT_TOOL
+]
 
-    thread = client.beta.threads.create()
+# Capability this agent needs from the model router
+CAPABILITY = "analysis"
 
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=f"Context: {json.dumps(context)}\n\nPrompt: {prompt}"
-    )
+def run_assistant(prompt, context):
+    client = get_client()
+    content = f"Context: {fit_context(context, prompt)}\n\nPrompt: {prompt}"
+    models = route(CAPABILITY, count_tokens(content))
 
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant.id
-    )
+    # Queries run against the DataFrames loaded into this context
+    tool_handlers = {
+        "execute_query": lambda arguments: execute_query(arguments["query"], arguments["df_name"], context),
+        "fetch_artifact": fetch_handler
+    }
 
-    while True:
-        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        if run_status.status in ['completed', 'failed', 'requires_action']:
-            break
-        time.sleep(1)
+    if agent_engine("query_builder", TOOLS) == "chat":
+        return run_chat(client, models, INSTRUCTIONS, TOOLS, content, tool_handlers)
 
-    if run_status.status == 'requires_action':
-        tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
-        tool_outputs = []
-        for tool_call in tool_calls:
-            if tool_call.function.name == "execute_query":
-                arguments = json.loads(tool_call.function.arguments)
-                df = globals()[arguments["df_name"]]
-                result = eval(arguments["query"])
-                output = result.to_dict() if isinstance(result, pd.DataFrame) else result
-            tool_outputs.append({
-                "tool_call_id": tool_call.id,
-                "output": json.dumps(output)
-            })
+    assistant_id = get_assistant_id(
+        client,
+        instructions=INSTRUCTIONS,
+        model=models[0],
+        tools=TOOLS
+    )
+
+    thread = client.beta.threads.create()
 
-        client.beta.threads.runs.submit_tool_outputs(
-            thread_id=thread.id,
-            run_id=run.id,
-            tool_outputs=tool_outputs
-        )
+    add_user_message(client, thread.id, content)
 
-        while True:
-            run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-            if run_status.status == 'completed':
-                break
-            time.sleep(1)
+    run_with_tools(client, thread.id, assistant_id, tool_handlers)
 
     messages = client.beta.threads.messages.list(thread_id=thread.id)
     query_result = ''
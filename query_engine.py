@@ -0,0 +1,158 @@
+import re
+import ast
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from context_serializer import loaded_version
+from config import QUERY_CACHE_SIZE
+
+try:
+    import duckdb  # In-process columnar SQL engine
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+# Pandas expressions are evaluated with only df, the loaded tables and these builtins in
+# scope. No modules are exposed, and the expression is checked before it runs so it cannot
+# reach private attributes, write files or modify the loaded DataFrames.
+SAFE_BUILTINS = {
+    "len": len, "min": min, "max": max, "sum": sum, "abs": abs, "round": round,
+    "sorted": sorted, "list": list, "dict": dict, "set": set, "tuple": tuple,
+    "range": range, "int": int, "float": float, "str": str, "bool": bool
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.Name, ast.Load, ast.Attribute, ast.Call, ast.keyword, ast.Constant,
+    ast.Subscript, ast.Slice, ast.Tuple, ast.List, ast.Dict, ast.Set, ast.Compare, ast.BoolOp,
+    ast.BinOp, ast.UnaryOp, ast.IfExp, ast.Lambda, ast.arguments, ast.arg, ast.ListComp,
+    ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.comprehension, ast.Store,
+    ast.boolop, ast.operator, ast.unaryop, ast.cmpop
+)
+# Methods that write files, evaluate strings, plot or mutate in place (on DataFrames,
+# their NumPy arrays or dicts); anything starting with "_" or "to_" is blocked as well
+BLOCKED_ATTRIBUTES = {
+    "tofile", "dump", "dumps", "ctypes", "eval", "format", "format_map", "plot", "hist", "boxplot",
+    "style", "insert", "pop", "update", "fill", "put", "itemset", "resize", "setflags",
+    "partition", "sort", "clear", "setdefault", "popitem", "isetitem"
+}
+BLOCKED_PREFIXES = ("_", "to_", "gi_", "f_", "co_", "tb_", "cr_", "ag_")
+# Methods that look up a function by its string name, e.g. df.agg("to_pickle", path=...)
+DISPATCH_METHODS = {"agg", "aggregate", "apply", "transform", "map", "applymap", "pipe"}
+# Names those methods may dispatch to
+DISPATCH_NAMES = {
+    "sum", "mean", "median", "min", "max", "count", "size", "nunique", "std", "var", "sem",
+    "prod", "first", "last", "any", "all", "idxmin", "idxmax", "skew", "cumsum", "cumprod",
+    "cummin", "cummax", "rank", "abs", "round"
+}
+# SQL runs with file, network and extension access disabled, and the setting locked
+DUCKDB_CONFIG = {"enable_external_access": False, "lock_configuration": True}
+
+SQL_PATTERN = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def loaded_tables(context):
+    # Only successfully loaded DataFrames are queryable; load errors are stored as strings
+    dataframes = (context or {}).get("dataframes", {})
+    return {name: df for name, df in dataframes.items() if isinstance(df, pd.DataFrame)}
+
+def is_sql(query):
+    return bool(SQL_PATTERN.match(query))
+
+def run_sql(query, tables):
+    if not HAS_DUCKDB:
+        raise ValueError("SQL queries require duckdb; use a pandas expression on df instead")
+    connection = duckdb.connect(config=DUCKDB_CONFIG)
+    try:
+        statements = connection.extract_statements(query)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("SQL queries must be a single SELECT statement")
+        for name, df in tables.items():
+            connection.register(name, df)
+        return connection.execute(query).df()
+    finally:
+        connection.close()
+
+def dispatched_names(node):
+    # String function names passed to a dispatch method: bare, in lists, as dict values and
+    # as the function half of named aggregations like total=("col", "sum"). Lambdas are skipped.
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        yield node.value
+    elif isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        elements = node.elts[1:] if isinstance(node, ast.Tuple) and len(node.elts) == 2 else node.elts
+        for element in elements:
+            yield from dispatched_names(element)
+    elif isinstance(node, ast.Dict):
+        for value in node.values:
+            yield from dispatched_names(value)
+
+def check_dispatch(call):
+    if not isinstance(call.func, ast.Attribute) or call.func.attr not in DISPATCH_METHODS:
+        return
+    # The function is the first positional argument, func=/arg=, or a named aggregation tuple
+    functions = call.args[:1] + [
+        keyword.value for keyword in call.keywords
+        if keyword.arg in ("func", "arg") or isinstance(keyword.value, ast.Tuple)
+    ]
+    for argument in functions:
+        for name in dispatched_names(argument):
+            if name not in DISPATCH_NAMES:
+                raise ValueError(f"'{name}' is not allowed as a function name in .{call.func.attr}()")
+
+def check_expression(query):
+    try:
+        tree = ast.parse(query.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid pandas expression: {e.msg}")
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"{type(node).__name__} is not allowed in pandas expressions")
+        if isinstance(node, ast.Attribute) and (node.attr in BLOCKED_ATTRIBUTES or node.attr.startswith(BLOCKED_PREFIXES)):
+            raise ValueError(f"'.{node.attr}' is not allowed in pandas expressions")
+        if isinstance(node, ast.Call):
+            check_dispatch(node)
+        if isinstance(node, ast.keyword) and node.arg == "inplace":
+            raise ValueError("In-place changes to the loaded DataFrames are not allowed")
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and "__" in node.value:
+            raise ValueError("Double underscores are not allowed in queries")
+    return tree
+
+def run_expression(query, df, tables):
+    tree = check_expression(query)
+    namespace = {**tables, "df": df}
+    return eval(compile(tree, "<query>", "eval"), {"__builtins__": SAFE_BUILTINS}, namespace)
+
+def to_output(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return json.loads(result.to_json(date_format="iso", default_handler=str))
+    if isinstance(result, np.generic):
+        return result.item()
+    return result
+
+def execute_query(query, df_name, context):
+    tables = loaded_tables(context)
+    if not is_sql(query) and df_name not in tables:
+        raise ValueError(f"Unknown DataFrame '{df_name}'. Available: {sorted(tables)}")
+    # SQL and pandas expressions may both reference any loaded table, so every table version is part of the key
+    versions = tuple(sorted((name, loaded_version(df)) for name, df in tables.items()))
+    key = (query, None if is_sql(query) else df_name, versions)
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    if is_sql(query):
+        result = run_sql(query, tables)
+    else:
+        result = run_expression(query, tables[df_name], tables)
+    output = json.dumps(to_output(result), default=str)
+
+    with _cache_lock:
+        _cache[key] = output
+        while len(_cache) > QUERY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return output
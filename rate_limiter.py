@@ -0,0 +1,253 @@
+import re
+import json
+import time
+import random
+import threading
+import httpx
+from config import (
+    RATE_LIMITS, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_STATUSES,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS, RATE_LIMIT_MIN_FRACTION
+)
+
+# Shared request layer for OpenAI and Replicate. Every request waits for a token from its
+# provider's bucket and its model's bucket, retries 429/5xx and connection errors with
+# jittered exponential backoff, and fails fast while the provider's circuit is open.
+# Buckets slow down on 429s and rate-limit headers and recover gradually on success.
+
+PROVIDER_HOSTS = {
+    "api.openai.com": "openai",
+    "api.replicate.com": "replicate"
+}
+
+REPLICATE_MODEL_PATTERN = re.compile(r"^/v1/models/([^/]+/[^/]+)/")
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+class CircuitOpenError(httpx.TransportError):
+    pass
+
+class TokenBucket:
+    def __init__(self, requests_per_minute, burst=None):
+        self.max_rate = requests_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = burst or max(1, int(requests_per_minute / 60))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        # Blocks until a token is available; returns the seconds spent waiting
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def throttled(self, retry_after=None):
+        # Multiplicative decrease on a 429, and a full stop until the server says to retry
+        with self.lock:
+            self.rate = max(self.max_rate * RATE_LIMIT_MIN_FRACTION, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        # Additive increase back towards the configured rate
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def observe(self, remaining, reset_seconds):
+        # Never hold more tokens than the server says are left in its window
+        with self.lock:
+            self.tokens = min(self.tokens, float(remaining))
+            if remaining <= 0 and reset_seconds:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_seconds)
+
+class CircuitBreaker:
+    # Opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures; after the cooldown one
+    # probe request is let through, and its outcome closes or reopens the circuit
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, success):
+        with self.lock:
+            self.probing = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self.probing else "open"
+
+_buckets = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+_stats = {"requests": 0, "retries": 0, "throttled": 0, "circuit_rejections": 0, "wait_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+def get_bucket(key):
+    # Exact "provider:model" limits win; unlisted models only use the provider bucket
+    with _registry_lock:
+        if key not in _buckets:
+            limits = RATE_LIMITS.get(key)
+            _buckets[key] = TokenBucket(**limits) if limits else None
+        return _buckets[key]
+
+def get_breaker(provider):
+    with _registry_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker()
+        return _breakers[provider]
+
+def request_model(request, provider):
+    if provider == "replicate":
+        match = REPLICATE_MODEL_PATTERN.match(request.url.path)
+        return match.group(1) if match else None
+    if request.method != "POST" or not request.content:
+        return None
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return None
+    return body.get("model") if isinstance(body, dict) else None
+
+def parse_duration(value):
+    # OpenAI reset headers look like "20ms", "1s" or "6m0s"
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def retry_after(response):
+    if "retry-after-ms" in response.headers:
+        try:
+            return float(response.headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    return parse_duration(response.headers.get("retry-after")) or parse_duration(response.headers.get("x-ratelimit-reset-requests"))
+
+def backoff_delay(attempt):
+    # Full jitter: uniform between zero and the exponential cap
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+class RateLimitedTransport(httpx.BaseTransport):
+    def __init__(self, inner):
+        self.inner = inner
+
+    def handle_request(self, request):
+        request.read()  # The body is inspected here and sent again on retries
+        provider = PROVIDER_HOSTS.get(request.url.host, request.url.host)
+        model = request_model(request, provider)
+        buckets = [bucket for bucket in (get_bucket(provider), get_bucket(f"{provider}:{model}") if model else None) if bucket]
+        breaker = get_breaker(provider)
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                _count("circuit_rejections")
+                raise CircuitOpenError(f"Circuit open for {provider} after repeated failures", request=request)
+            for bucket in buckets:
+                _count("wait_seconds", bucket.acquire())
+            _count("requests")
+
+            try:
+                response = self.inner.handle_request(request)
+            except CircuitOpenError:
+                raise
+            except httpx.TransportError:
+                # Connection, read/write, timeout and protocol errors; the SDKs' own retries are off
+                breaker.record(False)
+                if attempt + 1 >= RETRY_MAX_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt)
+            except BaseException:
+                breaker.record(False)  # Always settle the breaker, or a failed probe would leave it half-open
+                raise
+            else:
+                self.observe(response, buckets)
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record(response.status_code < 500)
+                    for bucket in buckets:
+                        bucket.succeeded()
+                    return response
+                wait = retry_after(response)
+                if response.status_code == 429:
+                    _count("throttled")
+                    for bucket in buckets:
+                        bucket.throttled(wait)
+                    breaker.record(True)  # Throttling is the buckets' job, not the breaker's
+                else:
+                    breaker.record(response.status_code < 500)
+                if attempt + 1 >= RETRY_MAX_ATTEMPTS:
+                    return response
+                response.close()
+                delay = max(wait or 0, backoff_delay(attempt))
+
+            attempt += 1
+            _count("retries")
+            time.sleep(delay)
+
+    def observe(self, response, buckets):
+        remaining = response.headers.get("x-ratelimit-remaining-requests")
+        if remaining is None or not buckets:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+        # The headers describe the model's limit, so they apply to the most specific bucket
+        buckets[-1].observe(remaining, parse_duration(response.headers.get("x-ratelimit-reset-requests")))
+
+    def close(self):
+        self.inner.close()
+
+def limiter_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    with _registry_lock:
+        stats["circuits"] = {provider: breaker.state for provider, breaker in _breakers.items()}
+        stats["rates_per_minute"] = {key: round(bucket.rate * 60, 1) for key, bucket in _buckets.items() if bucket}
+    return stats
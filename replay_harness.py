@@ -0,0 +1,245 @@
+import json
+import time
+import base64
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from config import OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS, OPENAI_KEEPALIVE_EXPIRY
+
+# Record every OpenAI/Replicate HTTP interaction (including image downloads) to a
+# JSON-lines file, and replay the recordings from a local stand-in server with
+# configurable latency.
+
+# Response headers that describe the wire encoding of the recorded body, not the body itself
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+def default_transport():
+    return httpx.HTTPTransport(limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    ))
+
+def encode_body(content):
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(content).decode()}
+
+def decode_body(entry):
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return entry.get("body", "").encode("utf-8")
+
+class ObservedStream(httpx.SyncByteStream):
+    # Passes a response body through as it arrives, and reports the chunks and the close.
+    # Streamed responses (planner tokens, run events) then reach the caller unbuffered.
+    def __init__(self, stream, on_close, on_chunk=None):
+        self.stream = stream
+        self.on_close = on_close
+        self.on_chunk = on_chunk
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.stream:
+            if self.on_chunk is not None:
+                self.on_chunk(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.stream, "close"):
+                self.stream.close()
+        finally:
+            self.on_close()
+
+def observed_response(response, request, on_close, on_chunk=None):
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        stream=ObservedStream(response.stream, on_close, on_chunk),
+        extensions=response.extensions,
+        request=request
+    )
+
+class MeasuringTransport(httpx.BaseTransport):
+    # Times every request so benchmarks can separate API time from local overhead.
+    # A call ends when its body has been consumed and closed, and is recorded then.
+    def __init__(self, inner=None):
+        self.inner = inner or default_transport()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        call = {
+            "host": request.url.host,
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "started": started,
+            "headers_received": time.perf_counter()
+        }
+
+        def closed():
+            call["ended"] = time.perf_counter()
+            with self.lock:
+                self.calls.append(call)
+
+        return observed_response(response, request, closed)
+
+    def close(self):
+        self.inner.close()
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, path, inner=None):
+        self.path = path
+        self.inner = inner or default_transport()
+        self.lock = threading.Lock()
+
+    def handle_request(self, request):
+        # The body is passed through as it streams and written out once the response closes
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        chunks = []
+        # The recorded body is stored decoded, so the replayed response must not claim an encoding
+        headers = {key: value for key, value in response.headers.items() if key.lower() not in HOP_HEADERS}
+
+        def closed():
+            content = httpx.Response(response.status_code, headers=response.headers, content=b"".join(chunks)).content
+            entry = {
+                "host": request.url.host,
+                "method": request.method,
+                "path": request.url.path,
+                "query": request.url.query.decode() if isinstance(request.url.query, bytes) else str(request.url.query),
+                "request": request.content.decode("utf-8", errors="replace"),
+                "status": response.status_code,
+                "headers": headers,
+                "latency": round(time.perf_counter() - started, 4),
+                **encode_body(content)
+            }
+            with self.lock:
+                with open(self.path, 'a') as file:
+                    file.write(json.dumps(entry) + "\n")
+
+        return observed_response(response, request, closed, chunks.append)
+
+    def close(self):
+        self.inner.close()
+
+def load_recordings(path):
+    # Recordings are replayed in order per (host, method, path)
+    recordings = defaultdict(deque)
+    with open(path, 'r') as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                recordings[(entry["host"], entry["method"], entry["path"])].append(entry)
+    return recordings
+
+class ReplayServer:
+    # Serves recorded responses over HTTP. The original host is passed in the
+    # X-Replay-Host header so OpenAI and Replicate recordings can share one server.
+    def __init__(self, recording_path, latency_scale=1.0, fixed_latency=None, host="127.0.0.1", port=0):
+        self.recordings = load_recordings(recording_path)
+        self.latency_scale = latency_scale
+        self.fixed_latency = fixed_latency
+        self.lock = threading.Lock()
+        self.misses = []
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_entry(self, key):
+        with self.lock:
+            queue = self.recordings.get(key)
+            if not queue:
+                self.misses.append(key)
+                return None
+            # The last response is sticky, so extra polls keep getting the final state
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def handler_class(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                path = self.path.split("?", 1)[0]
+                key = (self.headers.get("X-Replay-Host", ""), self.command, path)
+                entry = replay.next_entry(key)
+                if entry is None:
+                    body = json.dumps({"error": {"message": f"No recording for {key}"}}).encode()
+                    status, headers = 404, {"content-type": "application/json"}
+                else:
+                    time.sleep(replay.fixed_latency if replay.fixed_latency is not None else entry["latency"] * replay.latency_scale)
+                    body = decode_body(entry)
+                    status, headers = entry["status"], entry["headers"]
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_DELETE = do_PUT = do_PATCH = respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class ReplayTransport(httpx.BaseTransport):
+    # Sends every request to the replay server, remembering which host it was meant for
+    def __init__(self, server_url, inner=None):
+        self.server_url = httpx.URL(server_url)
+        self.inner = inner or default_transport()
+
+    def handle_request(self, request):
+        request.headers["X-Replay-Host"] = request.url.host
+        request.url = request.url.copy_with(
+            scheme=self.server_url.scheme,
+            host=self.server_url.host,
+            port=self.server_url.port
+        )
+        return self.inner.handle_request(request)
+
+    def close(self):
+        self.inner.close()
+
+def install_transport(transport):
+    # Route the shared OpenAI client, the Replicate client and image downloads through transport.
+    # Must run before master_agent is imported, since it grabs the client at import time.
+    import image_generation
+    from openai_client import configure_client
+    from downloads import configure_downloads
+    configure_client(transport=transport)
+    image_generation.replicate_client_options["transport"] = transport
+    configure_downloads(transport)
@@ -0,0 +1,202 @@
+import re
+import json
+import pandas as pd
+from query_engine import loaded_tables
+from artifact_store import get as get_artifact
+from config import VALIDATOR_MIN_PASSES
+
+# Local, deterministic checks of a query result against the request. Each rule looks at
+# the prompt, the result and the loaded DataFrames' schema and returns (True, message),
+# (False, message) or None when it does not apply. Only structural rules (no result, an
+# error result) can reject on their own: the other rules read the prompt heuristically, so
+# when one fails the result goes to the LLM validator. Enough passing rules decide it is valid.
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20, "fifty": 50, "hundred": 100
+}
+NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+DESCENDING_WORDS = ["top", "largest", "highest", "tallest", "biggest", "most", "greatest", "descending"]
+ASCENDING_WORDS = ["bottom", "smallest", "lowest", "shortest", "least", "fewest", "ascending"]
+RANKING_WORDS = DESCENDING_WORDS + ASCENDING_WORDS + ["first", "last"]
+COUNT_PATTERNS = [
+    re.compile(r"\b(?:" + "|".join(RANKING_WORDS) + r")\s+" + NUMBER + r"\b", re.IGNORECASE),
+    re.compile(r"\b" + NUMBER + r"\s+(?:" + "|".join(RANKING_WORDS) + r"|rows|records|results)\b", re.IGNORECASE)
+]
+# Keys a model commonly wraps a result in
+WRAPPER_KEYS = ["result", "results", "data", "query_result", "rows", "records", "output"]
+
+class ValidationRequest:
+    def __init__(self, prompt, result, tables):
+        self.prompt = prompt
+        self.text = prompt.lower()
+        self.result = result
+        self.frame = result_frame(result)
+        self.tables = tables
+
+    def expected_rows(self):
+        for pattern in COUNT_PATTERNS:
+            match = pattern.search(self.prompt)
+            if match:
+                word = match.group(1).lower()
+                return int(word) if word.isdigit() else NUMBER_WORDS[word]
+        return None
+
+    def direction(self):
+        # "descending", "ascending" or None, from the first ranking word in the prompt
+        positions = {}
+        for word in DESCENDING_WORDS + ASCENDING_WORDS:
+            match = re.search(r"\b" + word + r"\b", self.text)
+            if match:
+                positions[match.start()] = "descending" if word in DESCENDING_WORDS else "ascending"
+        return positions[min(positions)] if positions else None
+
+    def mentioned_columns(self):
+        # Schema columns named in the prompt, with or without underscores
+        mentioned = {}
+        for df in self.tables.values():
+            for column in df.columns:
+                name = str(column).lower()
+                for variant in {name, name.replace("_", " ")}:
+                    if re.search(r"\b" + re.escape(variant) + r"\b", self.text):
+                        mentioned[str(column)] = df[column]
+        return mentioned
+
+    def numeric_columns(self):
+        # Result columns that are numeric in the schema, or entirely numeric in the result
+        schema = {}
+        for df in self.tables.values():
+            for column in df.columns:
+                if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]):
+                    schema[str(column)] = True
+        numeric = []
+        for column in self.frame.columns:
+            values = self.frame[column]
+            if str(column) in schema or (values.notna().all() and pd.to_numeric(values, errors="coerce").notna().all()):
+                numeric.append(column)
+        return numeric
+
+def unwrap(value):
+    while isinstance(value, dict) and len(value) == 1 and next(iter(value)).lower() in WRAPPER_KEYS:
+        value = next(iter(value.values()))
+    return value
+
+def result_frame(result):
+    # Turn the shapes query results arrive in (to_json output or model-written JSON) into a DataFrame
+    result = unwrap(result)
+    if isinstance(result, list) and result and all(isinstance(row, dict) for row in result):
+        return pd.DataFrame(result)
+    if isinstance(result, list) and all(not isinstance(value, (dict, list)) for value in result):
+        return pd.DataFrame({"value": result})
+    if isinstance(result, dict) and result:
+        if all(isinstance(value, dict) for value in result.values()):
+            return pd.DataFrame(result)  # Column -> {index -> value}, as DataFrame.to_json writes it
+        if all(not isinstance(value, (dict, list)) for value in result.values()):
+            return pd.DataFrame({"value": list(result.values())}, index=list(result.keys()))
+    return None
+
+RULES = []
+STRUCTURAL_RULES = set()
+
+def rule(function=None, structural=False):
+    # Register a validator; rules run in registration order
+    def register(function):
+        RULES.append(function)
+        if structural:
+            STRUCTURAL_RULES.add(function)
+        return function
+    return register(function) if function is not None else register
+
+@rule(structural=True)
+def result_present(request):
+    result = unwrap(request.result)
+    if result is None or result == {} or result == []:
+        return False, "The query returned no result."
+    if isinstance(result, str) and result.lower().startswith("error"):
+        return False, f"The query failed: {result[:200]}"
+    return None
+
+@rule
+def row_count(request):
+    expected = request.expected_rows()
+    if expected is None or request.frame is None:
+        return None
+    if len(request.tables) == 1:
+        expected = min(expected, len(next(iter(request.tables.values()))))
+    if len(request.frame) != expected:
+        return False, f"The request asks for {expected} rows but the result has {len(request.frame)}."
+    return True, f"The result has the {expected} rows requested."
+
+@rule
+def referenced_columns(request):
+    mentioned = request.mentioned_columns()
+    if request.frame is None or not mentioned or list(request.frame.columns) == ["value"]:
+        return None
+    columns = {str(column).lower() for column in request.frame.columns}
+    found = [column for column in mentioned if column.lower() in columns]
+    if not found:
+        return False, f"The result has none of the requested columns: {sorted(mentioned)}."
+    return True, f"The result includes the requested columns {found}."
+
+@rule
+def non_null_numeric(request):
+    if request.frame is None or request.frame.empty:
+        return None
+    numeric = request.numeric_columns()
+    if not numeric:
+        return None
+    for column in numeric:
+        values = pd.to_numeric(request.frame[column], errors="coerce")
+        if values.isna().any():
+            return False, f"Column '{column}' has missing or non-numeric values."
+    return True, f"Numeric columns {[str(column) for column in numeric]} have no missing values."
+
+@rule
+def sort_order(request):
+    direction = request.direction()
+    if direction is None or request.frame is None or len(request.frame) < 2:
+        return None
+    numeric = request.numeric_columns()
+    mentioned = [column for column in numeric if str(column) in request.mentioned_columns()]
+    candidates = mentioned or numeric
+    if len(candidates) != 1:
+        return None  # Ambiguous which column the order applies to
+    values = pd.to_numeric(request.frame[candidates[0]], errors="coerce")
+    ordered = values.is_monotonic_decreasing if direction == "descending" else values.is_monotonic_increasing
+    if not ordered:
+        return False, f"The result is not sorted in {direction} order of '{candidates[0]}'."
+    return True, f"The result is sorted in {direction} order of '{candidates[0]}'."
+
+def query_result(context):
+    result = context.get("query_result")
+    if isinstance(result, dict) and "artifact" in result:
+        text = get_artifact(result["artifact"])  # Stored in full by the artifact store
+        result = json.loads(text) if result.get("kind") == "json" else text
+    return result
+
+def validate_locally(prompt, context, min_passes=VALIDATOR_MIN_PASSES):
+    # Returns {"is_valid", "message", "checks"} when the rules decide, otherwise None
+    if "query_result" not in (context or {}):
+        return None
+    request = ValidationRequest(prompt, query_result(context), loaded_tables(context))
+    passed = []
+    for check in RULES:
+        try:
+            outcome = check(request)
+        except Exception:
+            continue  # A rule that cannot evaluate this result does not decide anything
+        if outcome is None:
+            continue
+        ok, message = outcome
+        if not ok:
+            if check in STRUCTURAL_RULES:
+                return {"is_valid": False, "message": message, "checks": [check.__name__]}
+            return None  # A heuristic mismatch may be a misread request; let the LLM decide
+        passed.append((check.__name__, message))
+    if len(passed) < min_passes:
+        return None
+    return {
+        "is_valid": True,
+        "message": " ".join(message for _, message in passed),
+        "checks": [name for name, _ in passed]
+    }
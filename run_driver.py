@@ -0,0 +1,266 @@
+import time
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from openai import NotFoundError
+from config import (
+    RUN_STREAMING, RUN_POLL_INITIAL_INTERVAL, RUN_POLL_MAX_INTERVAL, RUN_POLL_BACKOFF,
+    TOOL_MAX_WORKERS, TOOL_CONCURRENCY_LIMITS, MAX_TOOL_ROUNDS, AGENT_ENGINES, DEFAULT_AGENT_ENGINE, WAIT_LOG_SIZE
+)
+from tracing import span, current_span, usage_attributes
+from token_budget import current_allowance, truncate_text, record_prompt, record_usage
+from model_router import call_with_fallback
+from assistant_registry import recreate_assistant
+
+# Statuses at which a run stops making progress on its own
+STOP_STATUSES = ['completed', 'failed', 'cancelled', 'expired', 'incomplete', 'requires_action']
+
+class RunFailedError(RuntimeError):
+    pass
+
+# Waits are recorded here so callers can see where the time went. Only the most recent
+# WAIT_LOG_SIZE are kept. wait_count is the number of waits ever recorded and each
+# entry's seq its position in it.
+wait_log = deque(maxlen=WAIT_LOG_SIZE)
+wait_count = 0
+_wait_log_lock = threading.Lock()
+
+def waits_since(seq):
+    with _wait_log_lock:
+        return [entry for entry in wait_log if entry["seq"] >= seq]
+
+def record_wait(run_id, phase, mode, seconds, polls, status, sleep_seconds=0.0):
+    global wait_count
+    entry = {
+        "run_id": run_id,
+        "phase": phase,
+        "mode": mode,
+        "seconds": round(seconds, 3),
+        "polls": polls,
+        "sleep_seconds": round(sleep_seconds, 3),
+        "status": status
+    }
+    with _wait_log_lock:
+        entry["seq"] = wait_count
+        wait_log.append(entry)
+        wait_count += 1
+    return entry
+
+def wait_for_run(client, thread_id, run_id, phase="run"):
+    # Adaptive backoff polling: fast at first, then slower for long runs
+    with span("run.poll", phase=phase, run_id=run_id) as wait_span:
+        started = time.perf_counter()
+        interval = RUN_POLL_INITIAL_INTERVAL
+        polls = 0
+        sleep_seconds = 0.0
+        while True:
+            run_status = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            polls += 1
+            if run_status.status in STOP_STATUSES:
+                break
+            time.sleep(interval)
+            sleep_seconds += interval
+            interval = min(interval * RUN_POLL_BACKOFF, RUN_POLL_MAX_INTERVAL)
+        wait_span.set(polls=polls, sleep_seconds=round(sleep_seconds, 3), status=run_status.status)
+        record_wait(run_id, phase, "poll", time.perf_counter() - started, polls, run_status.status, sleep_seconds)
+        return run_status
+
+def consume_stream(client, thread_id, stream, phase, started, run_id=None):
+    # Read run events until the run stops; fall back to polling if the stream ends early
+    run_status = None
+    with span("run.stream", phase=phase) as stream_span:
+        with stream:
+            for event in stream:
+                data = getattr(event, 'data', None)
+                if getattr(data, 'object', None) == 'thread.run':
+                    run_id = data.id
+                    run_status = data
+                    if data.status in STOP_STATUSES:
+                        break
+        stream_span.set(run_id=run_id, status=getattr(run_status, 'status', None))
+    if run_status is not None and run_status.status in STOP_STATUSES:
+        record_wait(run_id, phase, "stream", time.perf_counter() - started, 0, run_status.status)
+        return run_status
+    if run_id is None:
+        raise RunFailedError("Run event stream ended before the run was created")
+    return wait_for_run(client, thread_id, run_id, phase=phase)
+
+def add_user_message(client, thread_id, content):
+    # Measure the prompt and truncate it to the current step allowance before sending
+    content = truncate_text(content, current_allowance())
+    record_prompt(content)
+    return client.beta.threads.messages.create(
+        thread_id=thread_id,
+        role="user",
+        content=content
+    )
+
+def start_run(client, thread_id, assistant_id, stream=RUN_STREAMING):
+    # Create a run and return it once it completes, fails or requires action
+    started = time.perf_counter()
+    if stream:
+        try:
+            events = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, stream=True)
+        except TypeError:
+            events = None  # SDK without streaming support
+        if events is not None:
+            return consume_stream(client, thread_id, events, "run", started)
+
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id)
+    return wait_for_run(client, thread_id, run.id, phase="run")
+
+def submit_tool_outputs(client, thread_id, run_id, tool_outputs, stream=RUN_STREAMING):
+    # Submit tool outputs and return the run once it stops again
+    started = time.perf_counter()
+    if stream:
+        try:
+            events = client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs,
+                stream=True
+            )
+        except TypeError:
+            events = None  # SDK without streaming support
+        if events is not None:
+            return consume_stream(client, thread_id, events, "tool_outputs", started, run_id=run_id)
+
+    client.beta.threads.runs.submit_tool_outputs(
+        thread_id=thread_id,
+        run_id=run_id,
+        tool_outputs=tool_outputs
+    )
+    return wait_for_run(client, thread_id, run_id, phase="tool_outputs")
+
+# One semaphore per tool name, shared by every run in the process
+_tool_semaphores = {}
+_tool_semaphores_lock = threading.Lock()
+
+def tool_semaphore(name):
+    with _tool_semaphores_lock:
+        if name not in _tool_semaphores:
+            _tool_semaphores[name] = threading.BoundedSemaphore(TOOL_CONCURRENCY_LIMITS.get(name, TOOL_MAX_WORKERS))
+        return _tool_semaphores[name]
+
+def execute_tool_call(tool_call, handlers, parent=None):
+    name = tool_call.function.name
+    if name not in handlers:
+        return f"Error: unknown tool {name}"
+    with span(f"tool.{name}", parent=parent, tool_call_id=tool_call.id) as tool_span:
+        try:
+            arguments = json.loads(tool_call.function.arguments)
+            with tool_semaphore(name):
+                output = handlers[name](arguments)
+        except Exception as e:
+            tool_span.set(error=str(e))
+            return f"Error executing {name}: {str(e)}"
+        output = output if isinstance(output, str) else json.dumps(output)
+        tool_span.set(output_chars=len(output))
+        return output
+
+def execute_tool_calls(tool_calls, handlers, max_workers=TOOL_MAX_WORKERS):
+    # Run every tool call of a round concurrently; outputs keep the order of tool_calls
+    parent = current_span()  # Worker threads do not inherit the current span
+    if len(tool_calls) == 1:
+        outputs = [execute_tool_call(tool_calls[0], handlers, parent)]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tool_calls)))) as executor:
+            outputs = list(executor.map(lambda tool_call: execute_tool_call(tool_call, handlers, parent), tool_calls))
+    return [
+        {"tool_call_id": tool_call.id, "output": output}
+        for tool_call, output in zip(tool_calls, outputs)
+    ]
+
+def run_with_tools(client, thread_id, assistant_id, handlers, max_rounds=MAX_TOOL_ROUNDS):
+    # Start a run and answer requires_action rounds until it stops for good.
+    # Runs that fail, expire, are cancelled, end incomplete or exceed max_rounds raise RunFailedError.
+    with span("run", assistant_id=assistant_id, thread_id=thread_id) as run_span:
+        try:
+            run_status = start_run(client, thread_id, assistant_id)
+        except NotFoundError:
+            # The registry pointed at an assistant that no longer exists; recreate it once
+            assistant_id = recreate_assistant(client, assistant_id)
+            if assistant_id is None:
+                raise
+            run_span.set(assistant_id=assistant_id, recreated=True)
+            run_status = start_run(client, thread_id, assistant_id)
+        rounds = 0
+        while run_status.status == 'requires_action':
+            if rounds >= max_rounds:
+                client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_status.id)
+                raise RunFailedError(f"Run {run_status.id} exceeded {max_rounds} tool call rounds")
+            tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
+            tool_outputs = execute_tool_calls(tool_calls, handlers)
+            run_status = submit_tool_outputs(client, thread_id, run_status.id, tool_outputs)
+            rounds += 1
+        record_usage(getattr(run_status, 'usage', None))
+        run_span.set(run_id=run_status.id, status=run_status.status, tool_rounds=rounds,
+                     **usage_attributes(getattr(run_status, 'usage', None)))
+        if run_status.status != 'completed':
+            raise RunFailedError(f"Run {run_status.id} {run_status.status}{run_failure_details(run_status)}")
+        return run_status
+
+def run_failure_details(run_status):
+    # last_error for failed runs, incomplete_details for incomplete ones
+    error = getattr(run_status, 'last_error', None)
+    if error is not None:
+        return f": {error.code}: {error.message}"
+    details = getattr(run_status, 'incomplete_details', None)
+    if details is not None:
+        return f": {details.reason}"
+    return ""
+
+def agent_engine(agent, tools):
+    # The chat engine only drives function tools; hosted tools such as code_interpreter need a run
+    engine = AGENT_ENGINES.get(agent, DEFAULT_AGENT_ENGINE)
+    if engine == "chat" and any(tool.get("type") != "function" for tool in tools):
+        return "assistants"
+    return engine
+
+def run_chat(client, models, instructions, tools, prompt, handlers, max_rounds=MAX_TOOL_ROUNDS):
+    # Drive the same tool schemas through chat.completions with the history kept in memory:
+    # one request per tool round instead of assistant, thread, message and run round trips.
+    # models is a model or a routed list; a failed request falls back to the next model.
+    # Returns the final assistant message text.
+    models = [models] if isinstance(models, str) else list(models)
+    content = truncate_text(prompt, current_allowance())
+    record_prompt(content)
+    messages = [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": content}
+    ]
+    options = {"tools": tools} if tools else {}
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    with span("chat", model=models[0]) as chat_span:
+        rounds = 0
+        while True:
+            response, model = call_with_fallback(
+                models,
+                lambda model: client.chat.completions.create(model=model, messages=messages, **options)
+            )
+            models = [model] + [other for other in models if other != model]  # Stay on the model that answered
+            record_usage(response.usage)
+            for key, value in usage_attributes(response.usage).items():
+                totals[key] += value
+            message = response.choices[0].message
+            if not message.tool_calls:
+                chat_span.set(model=model, tool_rounds=rounds, finish_reason=response.choices[0].finish_reason, **totals)
+                return message.content or ''
+            if rounds >= max_rounds:
+                raise RunFailedError(f"Chat with {model} exceeded {max_rounds} tool call rounds")
+            messages.append({
+                "role": "assistant",
+                "content": message.content,
+                "tool_calls": [
+                    {
+                        "id": tool_call.id,
+                        "type": "function",
+                        "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}
+                    }
+                    for tool_call in message.tool_calls
+                ]
+            })
+            for tool_output in execute_tool_calls(message.tool_calls, handlers):
+                messages.append({"role": "tool", "tool_call_id": tool_output["tool_call_id"], "content": tool_output["output"]})
+            rounds += 1
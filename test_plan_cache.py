@@ -0,0 +1,47 @@
+import plan_cache
+
+def use_memory_cache(monkeypatch):
+    monkeypatch.setattr(plan_cache, "PLAN_CACHE_DIR", None)
+    monkeypatch.setattr(plan_cache, "_memory", plan_cache.OrderedDict())
+
+def test_step_ids_matching_task_numbers_are_not_templated(monkeypatch):
+    use_memory_cache(monkeypatch)
+    plan = {"plan": [
+        {"id": "1", "agent": "file", "prompt": "Load /data/a.csv", "depends_on": []},
+        {"id": "2", "agent": "query_builder", "prompt": "Show the top 1 rows", "depends_on": ["1"]}
+    ]}
+    assert plan_cache.cache_plan("load /data/a.csv and show the top 1 rows", plan)
+
+    cached = plan_cache.get_cached_plan("load /data/b.csv and show the top 2 rows")
+    assert [step["id"] for step in cached["plan"]] == ["1", "2"]
+    assert cached["plan"][1]["depends_on"] == ["1"]
+    assert cached["plan"][0]["prompt"] == "Load /data/b.csv"
+    assert cached["plan"][1]["prompt"] == "Show the top 2 rows"
+
+def test_forget_cached_plan(monkeypatch):
+    use_memory_cache(monkeypatch)
+    plan = {"plan": [{"id": "1", "agent": "file", "prompt": "Load a.csv", "depends_on": []}]}
+    plan_cache.cache_plan("load a.csv", plan)
+    plan_cache.forget_cached_plan("load b.csv")
+    assert plan_cache.get_cached_plan("load c.csv") is None
+
+def test_file_name_and_stem_follow_the_path(monkeypatch):
+    use_memory_cache(monkeypatch)
+    plan = {"plan": [
+        {"id": "1", "agent": "data_loader", "prompt": "Load /data/Tall_Building_Inventory.csv", "depends_on": []},
+        {"id": "2", "agent": "query_builder", "prompt": "Find the top 5 heights in Tall_Building_Inventory", "depends_on": ["1"]},
+        {"id": "3", "agent": "reporter", "prompt": "Report on Tall_Building_Inventory.csv", "depends_on": ["2"]}
+    ]}
+    assert plan_cache.cache_plan("for /data/Tall_Building_Inventory.csv, load it and show the top 5 tallest", plan)
+
+    cached = plan_cache.get_cached_plan("for /data/other.csv, load it and show the top 10 tallest")
+    assert [step["prompt"] for step in cached["plan"]] == [
+        "Load /data/other.csv",
+        "Find the top 10 heights in other",
+        "Report on other.csv"
+    ]
+
+def test_plans_with_short_derived_forms_are_not_cached(monkeypatch):
+    use_memory_cache(monkeypatch)
+    plan = {"plan": [{"id": "1", "agent": "query_builder", "prompt": "Query table ab from /data/ab.csv", "depends_on": []}]}
+    assert not plan_cache.cache_plan("load /data/ab.csv", plan)
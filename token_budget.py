@@ -0,0 +1,87 @@
+import threading
+from contextlib import contextmanager
+from config import TOKEN_MODEL, TASK_TOKEN_BUDGET, STEP_TOKEN_BUDGET, MIN_STEP_TOKENS
+
+try:
+    import tiktoken  # Exact counts when available; otherwise a character-based estimate
+except ImportError:
+    tiktoken = None
+
+# Token accounting: prompts are measured before they are sent, actual usage is recorded
+# per step, and every step gets an allowance derived from the step and task budgets.
+_encodings = {}
+_encodings_lock = threading.Lock()
+_local = threading.local()
+
+def encoding_for(model):
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+        return _encodings[model]
+
+def count_tokens(text, model=TOKEN_MODEL):
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    return len(encoding_for(model).encode(text, disallowed_special=()))
+
+def truncate_text(text, max_tokens, model=TOKEN_MODEL):
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    marker = "\n... [truncated to fit the token budget]"
+    if tiktoken is None:
+        return text[:max_tokens * 4] + marker
+    encoding = encoding_for(model)
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]) + marker
+
+class TaskBudget:
+    def __init__(self, task_tokens=TASK_TOKEN_BUDGET, step_tokens=STEP_TOKEN_BUDGET):
+        self.task_tokens = task_tokens
+        self.step_tokens = step_tokens
+        self.steps = {}
+        self.lock = threading.Lock()
+
+    def used(self):
+        # Actual usage where the API reported it, the estimate otherwise
+        with self.lock:
+            return sum(max(record["estimated"], record["actual"]) for record in self.steps.values())
+
+    def remaining(self):
+        return self.task_tokens - self.used()
+
+    @contextmanager
+    def step(self, step_id):
+        # Over budget steps still run, with their context compacted to the minimum
+        allowance = max(MIN_STEP_TOKENS, min(self.step_tokens, self.remaining()))
+        record = {"allowance": allowance, "estimated": 0, "actual": 0}
+        with self.lock:
+            self.steps[step_id] = record
+        previous = getattr(_local, "step", None)
+        _local.step = record
+        try:
+            yield record
+        finally:
+            _local.step = previous
+
+    def summary(self):
+        with self.lock:
+            steps = {step_id: dict(record) for step_id, record in self.steps.items()}
+        return {"task_budget": self.task_tokens, "used": self.used(), "steps": steps}
+
+def current_allowance():
+    record = getattr(_local, "step", None)
+    return record["allowance"] if record is not None else STEP_TOKEN_BUDGET
+
+def record_prompt(text, model=TOKEN_MODEL):
+    tokens = count_tokens(text, model)
+    record = getattr(_local, "step", None)
+    if record is not None:
+        record["estimated"] += tokens
+    return tokens
+
+def record_usage(usage):
+    record = getattr(_local, "step", None)
+    if record is not None and usage is not None:
+        record["actual"] += getattr(usage, "total_tokens", 0) or 0
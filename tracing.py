@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from rich.table import Table
+from config import TRACING_ENABLED, TRACE_PATH
+
+# Lightweight spans for the orchestration loop. Finished spans are kept in memory,
+# exported as JSON lines to TRACE_PATH and summarized in a rich table.
+_local = threading.local()
+_finished = []
+_finished_lock = threading.Lock()
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key, amount):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+            with _finished_lock:
+                _finished.append(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            "thread": self.thread,
+            "attributes": self.attributes
+        }
+
+class NullSpan:
+    # Used when tracing is disabled, so call sites never need to check
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, key, amount):
+        pass
+
+    def end(self):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+def start_span(name, parent=None, **attributes):
+    # For spans that start and end in different callbacks; does not become the current span
+    if not TRACING_ENABLED:
+        return NULL_SPAN
+    return Span(name, parent if parent is not None else current_span(), attributes)
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    # parent is needed when the work runs on another thread than the span that caused it
+    if not TRACING_ENABLED:
+        yield NULL_SPAN
+        return
+    current = Span(name, parent if parent is not None else current_span(), attributes)
+    _stack().append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _stack().pop()
+        current.end()
+
+def finished_spans(trace_id=None):
+    with _finished_lock:
+        spans = list(_finished)
+    return [span for span in spans if trace_id is None or span.trace_id == trace_id]
+
+def export_spans(trace_id=None, path=TRACE_PATH):
+    # Append finished spans as JSON lines and drop them from memory
+    spans = finished_spans(trace_id)
+    if path is not None and spans:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a') as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict(), default=str) + "\n")
+    with _finished_lock:
+        exported = set(id(span) for span in spans)
+        _finished[:] = [span for span in _finished if id(span) not in exported]
+    return len(spans)
+
+def summary_table(trace_id=None, title="Where the time went"):
+    totals = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0, "tokens": 0, "sleep": 0.0})
+    for span in finished_spans(trace_id):
+        entry = totals[span.name]
+        entry["count"] += 1
+        entry["total"] += span.duration
+        entry["max"] = max(entry["max"], span.duration)
+        entry["tokens"] += span.attributes.get("total_tokens", 0)
+        entry["sleep"] += span.attributes.get("sleep_seconds", 0)
+
+    table = Table(title=title)
+    table.add_column("Span")
+    table.add_column("Count", justify="right")
+    table.add_column("Total (s)", justify="right")
+    table.add_column("Mean (s)", justify="right")
+    table.add_column("Max (s)", justify="right")
+    table.add_column("Sleeping (s)", justify="right")
+    table.add_column("Tokens", justify="right")
+    for name, entry in sorted(totals.items(), key=lambda item: -item[1]["total"]):
+        table.add_row(
+            name,
+            str(entry["count"]),
+            f"{entry['total']:.3f}",
+            f"{entry['total'] / entry['count']:.3f}",
+            f"{entry['max']:.3f}",
+            f"{entry['sleep']:.3f}" if entry["sleep"] else "",
+            str(entry["tokens"]) if entry["tokens"] else ""
+        )
+    return table
+
+def usage_attributes(usage):
+    # Token usage from a run or chat completion object
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0
+    }